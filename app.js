@@ -7,6 +7,7 @@ const CURRENCY_CATALOG_API = "/api/currencies";
 const CURRENCY_RATE_API = "/api/currency-rate";
 const ICON_RESOLVE_API = "/api/icons/resolve";
 const ICON_UPLOAD_API = "/api/icons/upload";
+const ICON_JOB_API = "/api/icons/jobs";
 const PREF_KEY = "subly_base_currency_v1";
 const SETTINGS_KEY = "subly_settings_v1";
 const AUTH_TOKEN_KEY = "subly_auth_token_v1";
@@ -1044,8 +1045,8 @@ async function request(url, options = {}) {
     headers.Authorization = `Bearer ${state.authToken}`;
   }
   const res = await fetch(url, {
-    headers,
     ...options,
+    headers,
   });
   if (res.status === 401) {
     if (!url.startsWith("/api/auth/")) {
@@ -1181,27 +1182,23 @@ async function setAdminUserStatus(userId, disabled) {
 }
 
 async function resolveIconOnline(name, category) {
-  const payload = await request(ICON_RESOLVE_API, {
+  let payload = await request(ICON_RESOLVE_API, {
     method: "POST",
     body: JSON.stringify({ name, category }),
   });
+  // Misses are resolved by a background job; long-poll it until it settles.
+  for (let attempt = 0; payload?.jobId && payload.status !== "done" && payload.status !== "failed" && attempt < 4; attempt += 1) {
+    payload = await request(`${ICON_JOB_API}/${encodeURIComponent(payload.jobId)}?wait=10`);
+  }
   return normalizeIconUrl(payload?.iconUrl || "");
 }
 
 async function uploadIconFile(file) {
-  const dataUrl = await new Promise((resolve, reject) => {
-    const reader = new FileReader();
-    reader.onload = () => resolve(String(reader.result || ""));
-    reader.onerror = () => reject(new Error("读取文件失败"));
-    reader.readAsDataURL(file);
-  });
-  const payload = await request(ICON_UPLOAD_API, {
+  // The raw file is streamed as the request body; no base64 data URL round trip.
+  const payload = await request(`${ICON_UPLOAD_API}?name=${encodeURIComponent(file.name || "icon")}`, {
     method: "POST",
-    body: JSON.stringify({
-      fileName: file.name || "icon",
-      mimeType: file.type || "",
-      dataUrl,
-    }),
+    headers: { "Content-Type": file.type || "application/octet-stream" },
+    body: file,
   });
   return normalizeIconUrl(payload?.iconUrl || "");
 }
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import server
+
+# Offline stand-in for open.er-api, frankfurter and openexchangerates. Point the
+# FX_*_URL variables at it to exercise the real HTTP provider path:
+#
+#   python3 fx_stub_server.py --port 5180 &
+#   FX_OPEN_ER_URL=http://127.0.0.1:5180/v6/latest/USD \
+#   FX_FRANKFURTER_URL=http://127.0.0.1:5180/latest \
+#   FX_CURRENCY_NAMES_URL=http://127.0.0.1:5180/api/currencies.json \
+#   python3 server.py
+#
+# `--bench N` instead starts the stub on a free port and times N full refreshes.
+
+
+class StubHandler(BaseHTTPRequestHandler):
+  # Keep-alive, so the bench exercises the server's pooled outbound connections.
+  protocol_version = "HTTP/1.1"
+  disable_nagle_algorithm = True
+  latency_ms = 0.0
+  fail_rate = 0.0
+
+  def log_message(self, fmt, *args):
+    pass
+
+  def _send(self, status_code, payload):
+    body = json.dumps(payload).encode("utf-8")
+    self.send_response(status_code)
+    self.send_header("Content-Type", "application/json; charset=utf-8")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self):
+    if self.latency_ms:
+      time.sleep(self.latency_ms / 1000)
+    if self.fail_rate and random.random() < self.fail_rate:
+      self._send(503, {"error": "stub failure"})
+      return
+    parsed = urlparse(self.path)
+    if parsed.path == "/v6/latest/USD":
+      self._send(200, {"result": "success", "base_code": "USD", "rates": server.STUB_USD_RATES})
+      return
+    if parsed.path == "/latest":
+      query = parse_qs(parsed.query)
+      codes = [c for c in (query.get("to", [""])[0] or "").split(",") if c]
+      rates = {c: server.STUB_USD_RATES[c] for c in codes if c in server.STUB_USD_RATES}
+      self._send(200, {"amount": 1.0, "base": "USD", "rates": rates})
+      return
+    if parsed.path == "/api/currencies.json":
+      self._send(200, server.STUB_CURRENCY_NAMES)
+      return
+    self._send(404, {"error": "Not Found"})
+
+
+def start_stub(host, port):
+  httpd = ThreadingHTTPServer((host, port), StubHandler)
+  thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+  thread.start()
+  return httpd
+
+
+def run_bench(rounds, host):
+  httpd = start_stub(host, 0)
+  base = f"http://{host}:{httpd.server_address[1]}"
+  server.FX_OPEN_ER_URL = f"{base}/v6/latest/USD"
+  server.FX_FRANKFURTER_URL = f"{base}/latest"
+  server.FX_CURRENCY_NAMES_URL = f"{base}/api/currencies.json"
+  persist = os.environ.get("FX_BENCH_PERSIST") == "1"
+  if persist:
+    server.init_db()
+  else:
+    server.persist_fx_snapshot = lambda *args, **kwargs: None
+    server.persist_currency_names = lambda *args, **kwargs: None
+  samples = []
+  for _ in range(rounds):
+    started = time.perf_counter()
+    server.refresh_fx_caches(force=True)
+    samples.append((time.perf_counter() - started) * 1000)
+  httpd.shutdown()
+  samples.sort()
+  print(f"rounds: {rounds}")
+  print(f"source: {server.FX_CACHE['source']} stale: {server.FX_CACHE['stale']}")
+  print(f"p50: {statistics.median(samples):.2f} ms")
+  print(f"p95: {samples[max(0, int(len(samples) * 0.95) - 1)]:.2f} ms")
+  print(f"max: {samples[-1]:.2f} ms")
+  for stats in server.collect_metrics()["fxProviders"]:
+    print(f"{stats['kind']}/{stats['name']}: calls={stats['calls']} failures={stats['failures']} avg={stats['avgLatencyMs']} ms")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Local FX provider stub for Subly")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=5180)
+  parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every response")
+  parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+  parser.add_argument("--bench", type=int, default=0, metavar="N", help="time N refreshes against the stub and exit")
+  args = parser.parse_args()
+  StubHandler.latency_ms = args.latency_ms
+  StubHandler.fail_rate = args.fail_rate
+  if args.bench:
+    run_bench(args.bench, args.host)
+    return
+  httpd = start_stub(args.host, args.port)
+  print(f"FX stub serving on http://{args.host}:{httpd.server_address[1]}")
+  try:
+    while True:
+      time.sleep(3600)
+  except KeyboardInterrupt:
+    httpd.shutdown()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import argparse
+import random
+import string
+import time
+
+import server
+
+# Micro-benchmark for the service hint matcher. Builds synthetic catalogs of
+# increasing size and compares the precompiled matcher with the old linear scan:
+#
+#   python3 icon_catalog_bench.py --sizes 15,100,1000,5000 --names 2000
+
+
+def synthetic_catalog(size, rng):
+  hints = list(server.SERVICE_ICON_HINTS)
+  aliases = dict(server.SERVICE_NAME_ALIASES)
+  while len(hints) < size:
+    keyword = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12)))
+    hints.append({"keyword": keyword, "domain": f"{keyword}.com", "icon": f"https://cdn.simpleicons.org/{keyword}"})
+    if len(hints) % 4 == 0:
+      aliases[f"{keyword}服务"] = [keyword]
+  return hints[:size], aliases
+
+
+def linear_hint_icon(catalog, name):
+  n = server.normalize_service_text(name)
+  for item in catalog.hints:
+    if item["keyword"] in n and item.get("icon"):
+      return item["icon"]
+  return ""
+
+
+def linear_alias_keys(catalog, name):
+  n = server.normalize_service_text(name)
+  return [key for key, _ in catalog.aliases if key in (name or "") or key.lower() in n]
+
+
+def sample_names(catalog, count, rng):
+  names = []
+  for _ in range(count):
+    roll = rng.random()
+    if roll < 0.4:
+      names.append(f"{rng.choice(catalog.hints)['keyword'].title()} Premium")
+    elif roll < 0.5 and catalog.aliases:
+      names.append(rng.choice(catalog.aliases)[0])
+    else:
+      names.append("".join(rng.choice(string.ascii_letters + " ") for _ in range(rng.randint(4, 24))))
+  return names
+
+
+def time_per_call(func, names):
+  started = time.perf_counter()
+  for name in names:
+    func(name)
+  return (time.perf_counter() - started) * 1e6 / len(names)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark service hint matching against catalog size")
+  parser.add_argument("--sizes", default="15,100,1000,5000", help="comma separated catalog sizes")
+  parser.add_argument("--names", type=int, default=2000, help="names resolved per catalog")
+  parser.add_argument("--seed", type=int, default=7)
+  args = parser.parse_args()
+  rng = random.Random(args.seed)
+
+  print(f"{'size':>6} {'build ms':>9} {'linear us':>10} {'matcher us':>11} {'candidates us':>14}")
+  for size in [int(v) for v in args.sizes.split(",") if v.strip()]:
+    hints, aliases = synthetic_catalog(size, rng)
+    started = time.perf_counter()
+    catalog = server.ServiceCatalog(hints, aliases)
+    build_ms = (time.perf_counter() - started) * 1000
+    names = sample_names(catalog, args.names, rng)
+
+    server.SERVICE_CATALOG = catalog
+    for name in names:
+      assert server.resolve_hint_icon(name) == linear_hint_icon(catalog, name), name
+      assert [k for k, _ in catalog.match_aliases(name, server.normalize_service_text(name))] == linear_alias_keys(catalog, name), name
+    linear_us = time_per_call(lambda name: (linear_hint_icon(catalog, name), linear_alias_keys(catalog, name)), names)
+    matcher_us = time_per_call(
+      lambda name: (server.resolve_hint_icon(name), catalog.match_aliases(name, server.normalize_service_text(name))),
+      names,
+    )
+    candidates_us = time_per_call(server.build_icon_candidates, names)
+    print(f"{size:>6} {build_ms:>9.2f} {linear_us:>10.2f} {matcher_us:>11.2f} {candidates_us:>14.2f}")
+
+
+if __name__ == "__main__":
+  main()
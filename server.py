@@ -1,21 +1,46 @@
 #!/usr/bin/env python3
 import hashlib
 import hmac
+import html
 import base64
+import gzip
+import io
 import json
 import mimetypes
+import mmap
 import os
+import queue
 import re
 import secrets
+import signal
+import socket
 import sqlite3
-import subprocess
+import ssl
+import struct
+import sys
+import threading
 import time
+import traceback
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures import wait as futures_wait
+from contextlib import contextmanager
 from datetime import UTC, datetime, timedelta
-from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.utils import formatdate, parsedate_to_datetime
+from http.client import HTTPConnection, HTTPException, HTTPSConnection, RemoteDisconnected
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
 from pathlib import Path
-from urllib.error import URLError
-from urllib.parse import parse_qs, quote, urlparse
-from urllib.request import Request, urlopen
+from urllib.error import HTTPError, URLError
+from urllib.parse import parse_qs, quote, urljoin, urlparse
+from urllib.request import getproxies, proxy_bypass
+
+try:
+  from PIL import Image
+except ImportError:
+  Image = None
 
 BASE_DIR = Path(__file__).resolve().parent
 DB_PATH_RAW = os.environ.get("DB_PATH", "subly.db")
@@ -24,14 +49,59 @@ if not DB_PATH.is_absolute():
   DB_PATH = (BASE_DIR / DB_PATH).resolve()
 SUPER_ADMIN_USERNAME = os.environ.get("SUPER_ADMIN_USERNAME", "superadmin")
 SUPER_ADMIN_PASSWORD = os.environ.get("SUPER_ADMIN_PASSWORD", "Subly@123456")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "8192"))
 
 CURRENCY_CODES = {"CNY", "TWD", "USD", "EUR", "GBP", "JPY", "HKD", "SGD", "AUD", "CAD", "PHP"}
 
 SESSION_EXPIRE_DAYS = 14
+SESSION_CACHE_MAX_ENTRIES = int(os.environ.get("SESSION_CACHE_MAX_ENTRIES", "4096"))
+SESSION_CACHE_TTL_SECONDS = float(os.environ.get("SESSION_CACHE_TTL_SECONDS", "60"))
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.environ.get("SESSION_SWEEP_INTERVAL_SECONDS", "300"))
+SESSION_SWEEP_BATCH_SIZE = int(os.environ.get("SESSION_SWEEP_BATCH_SIZE", "500"))
 PASSWORD_ITERATIONS = 180000
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.environ.get("PASSWORD_HASH_RETRY_AFTER_SECONDS", "2"))
 
 FX_CACHE_TTL_SECONDS = 30 * 60
+CURRENCY_NAME_TTL_SECONDS = 24 * 60 * 60
+FX_REFRESH_INTERVAL_SECONDS = float(os.environ.get("FX_REFRESH_INTERVAL_SECONDS", "60"))
+FX_REFRESH_AHEAD_SECONDS = float(os.environ.get("FX_REFRESH_AHEAD_SECONDS", "300"))
+FX_REFRESH_RETRY_SECONDS = float(os.environ.get("FX_REFRESH_RETRY_SECONDS", "30"))
+FX_FETCH_DEADLINE_SECONDS = float(os.environ.get("FX_FETCH_DEADLINE_SECONDS", "8"))
+FX_FETCH_TIMEOUT_SECONDS = float(os.environ.get("FX_FETCH_TIMEOUT_SECONDS", "6"))
+FX_FETCH_RETRIES = int(os.environ.get("FX_FETCH_RETRIES", "1"))
+HTTP_USER_AGENT = "Subly/1.0 (+https://localhost)"
+HTTP_POOL_MAX_IDLE_PER_HOST = int(os.environ.get("HTTP_POOL_MAX_IDLE_PER_HOST", "4"))
+HTTP_POOL_IDLE_SECONDS = float(os.environ.get("HTTP_POOL_IDLE_SECONDS", "30"))
+HTTP_RETRY_STATUSES = {429, 502, 503, 504}
+FX_RATE_PROVIDER_NAMES = os.environ.get("FX_RATE_PROVIDERS", "open-er-api,frankfurter")
+FX_NAME_PROVIDER_NAMES = os.environ.get("FX_NAME_PROVIDERS", "openexchangerates")
+FX_OPEN_ER_URL = os.environ.get("FX_OPEN_ER_URL", "https://open.er-api.com/v6/latest/USD")
+FX_FRANKFURTER_URL = os.environ.get("FX_FRANKFURTER_URL", "https://api.frankfurter.app/latest")
+FX_CURRENCY_NAMES_URL = os.environ.get("FX_CURRENCY_NAMES_URL", "https://openexchangerates.org/api/currencies.json")
+FX_BREAKER_FAILURES = int(os.environ.get("FX_BREAKER_FAILURES", "3"))
+FX_BREAKER_RESET_SECONDS = float(os.environ.get("FX_BREAKER_RESET_SECONDS", "300"))
 ICON_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+ICON_PROBE_WORKERS = int(os.environ.get("ICON_PROBE_WORKERS", "16"))
+ICON_RESOLVE_DEADLINE_SECONDS = float(os.environ.get("ICON_RESOLVE_DEADLINE_SECONDS", "8"))
+ITUNES_SEARCH_COUNTRIES = ("cn", "us")
+ICON_NEGATIVE_TTL_SECONDS = float(os.environ.get("ICON_NEGATIVE_TTL_SECONDS", str(6 * 60 * 60)))
+ICON_MEMORY_CACHE_MAX_ENTRIES = int(os.environ.get("ICON_MEMORY_CACHE_MAX_ENTRIES", "2048"))
+ICON_JOB_WORKERS = int(os.environ.get("ICON_JOB_WORKERS", "4"))
+ICON_JOB_QUEUE_LIMIT = int(os.environ.get("ICON_JOB_QUEUE_LIMIT", "256"))
+ICON_JOB_RETENTION_SECONDS = float(os.environ.get("ICON_JOB_RETENTION_SECONDS", "300"))
+ICON_JOB_MAX_WAIT_SECONDS = 20.0
+ICON_BATCH_MAX_ITEMS = int(os.environ.get("ICON_BATCH_MAX_ITEMS", "100"))
+ICON_BATCH_WORKERS = int(os.environ.get("ICON_BATCH_WORKERS", "8"))
+ICON_BATCH_DEADLINE_SECONDS = float(os.environ.get("ICON_BATCH_DEADLINE_SECONDS", "15"))
+ICON_BATCH_QUEUE_LIMIT = int(os.environ.get("ICON_BATCH_QUEUE_LIMIT", "256"))
+ICON_MIRROR_ENABLED = os.environ.get("ICON_MIRROR", "0") == "1"
+ICON_MIRROR_SIZE = int(os.environ.get("ICON_MIRROR_SIZE", "128"))
+ICON_MIRROR_MAX_BYTES = int(os.environ.get("ICON_MIRROR_MAX_BYTES", str(1024 * 1024)))
+ICON_MIRROR_RETRY_SECONDS = float(os.environ.get("ICON_MIRROR_RETRY_SECONDS", "3600"))
 FALLBACK_USD_RATES = {
   "USD": 1.0,
   "CNY": 7.2,
@@ -45,20 +115,64 @@ FALLBACK_USD_RATES = {
   "CAD": 1.35,
   "PHP": 56.0,
 }
+STUB_USD_RATES = {
+  **FALLBACK_USD_RATES,
+  "KRW": 1350.0,
+  "INR": 83.0,
+  "THB": 36.0,
+  "MYR": 4.7,
+  "CHF": 0.88,
+  "NZD": 1.64,
+}
+STUB_CURRENCY_NAMES = {
+  "USD": "United States Dollar",
+  "CNY": "Chinese Yuan",
+  "TWD": "New Taiwan Dollar",
+  "EUR": "Euro",
+  "GBP": "British Pound Sterling",
+  "JPY": "Japanese Yen",
+  "HKD": "Hong Kong Dollar",
+  "SGD": "Singapore Dollar",
+  "AUD": "Australian Dollar",
+  "CAD": "Canadian Dollar",
+  "PHP": "Philippine Peso",
+  "KRW": "South Korean Won",
+  "INR": "Indian Rupee",
+  "THB": "Thai Baht",
+  "MYR": "Malaysian Ringgit",
+  "CHF": "Swiss Franc",
+  "NZD": "New Zealand Dollar",
+}
+FX_CACHE_LOCK = threading.Lock()
+# Bumped under FX_CACHE_LOCK whenever any FX cache changes; derived tables key on it.
+FX_STATE = {"version": 0}
+RATE_MATRIX_CACHE = {"version": -1, "bases": {}}
+RATE_MATRIX_LOCK = threading.Lock()
+FX_FETCH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="fx-fetch")
 FX_CACHE = {
   "loaded_at": 0.0,
   "updated_at": "",
   "source": "fallback",
   "rates": FALLBACK_USD_RATES.copy(),
   "missing_codes": sorted(CURRENCY_CODES),
+  "stale": True,
+  "attempted_at": 0.0,
+  "last_error": "",
 }
 OPEN_ER_CACHE = {
   "loaded_at": 0.0,
   "rates": {},
+  "source": "",
+  "stale": True,
+  "attempted_at": 0.0,
+  "last_error": "",
 }
 CURRENCY_NAME_CACHE = {
   "loaded_at": 0.0,
   "names": {},
+  "stale": True,
+  "attempted_at": 0.0,
+  "last_error": "",
 }
 
 SERVICE_ICON_HINTS = [
@@ -90,6 +204,7 @@ SERVICE_NAME_ALIASES = {
   "b站": ["bilibili"],
   "哔哩哔哩": ["bilibili"],
 }
+SERVICE_CATALOG_PATH = os.environ.get("SERVICE_CATALOG_PATH", "")
 UPLOAD_DIR = BASE_DIR / "assets" / "uploads"
 ALLOWED_UPLOAD_MIME = {
   "image/png": ".png",
@@ -99,6 +214,31 @@ ALLOWED_UPLOAD_MIME = {
   "image/svg+xml": ".svg",
 }
 MAX_ICON_UPLOAD_BYTES = 1024 * 1024
+UPLOAD_CHUNK_BYTES = 64 * 1024
+UPLOAD_GC_INTERVAL_SECONDS = float(os.environ.get("UPLOAD_GC_INTERVAL_SECONDS", str(6 * 60 * 60)))
+UPLOAD_GC_MIN_AGE_SECONDS = float(os.environ.get("UPLOAD_GC_MIN_AGE_SECONDS", str(24 * 60 * 60)))
+UPLOAD_REF_RE = re.compile(r"/assets/uploads/([^/?#]+)")
+STATIC_CACHE_MAX_ENTRIES = int(os.environ.get("STATIC_CACHE_MAX_ENTRIES", "512"))
+STATIC_CACHE_MAX_BYTES = int(os.environ.get("STATIC_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+STATIC_CACHE_MAX_FILE_BYTES = int(os.environ.get("STATIC_CACHE_MAX_FILE_BYTES", str(2 * 1024 * 1024)))
+STATIC_GZIP_MIN_BYTES = 512
+HTTP_KEEPALIVE_TIMEOUT_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_TIMEOUT_SECONDS", "15"))
+HTTP_KEEPALIVE_MAX_REQUESTS = int(os.environ.get("HTTP_KEEPALIVE_MAX_REQUESTS", "1000"))
+HTTP_DRAIN_LIMIT_BYTES = 64 * 1024
+SERVER_MODE = os.environ.get("SERVER_MODE", "threading").strip().lower()
+SERVER_MODES = ("threading", "pool")
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", "32"))
+SERVER_QUEUE_LIMIT = int(os.environ.get("SERVER_QUEUE_LIMIT", "64"))
+SERVER_RETRY_AFTER_SECONDS = int(os.environ.get("SERVER_RETRY_AFTER_SECONDS", "1"))
+SERVER_POOL_KEEPALIVE_SECONDS = float(os.environ.get("SERVER_POOL_KEEPALIVE_SECONDS", "2"))
+SERVER_PROCESSES = int(os.environ.get("SERVER_PROCESSES", "1"))
+FX_SYNC_INTERVAL_SECONDS = float(os.environ.get("FX_SYNC_INTERVAL_SECONDS", "60"))
+CACHE_INVALIDATION_RETENTION_SECONDS = 24 * 60 * 60
+JSON_COMPRESS_MIN_BYTES = int(os.environ.get("JSON_COMPRESS_MIN_BYTES", "1024"))
+JSON_COMPRESS_LEVEL = int(os.environ.get("JSON_COMPRESS_LEVEL", "6"))
+STATIC_GZIP_TYPES = {"application/javascript", "application/json", "image/svg+xml", "image/x-icon", "image/vnd.microsoft.icon"}
+MIRROR_DIR = BASE_DIR / "assets" / "mirror"
+MIRROR_URL_PREFIX = "/assets/mirror/"
 
 DEMO_SUBSCRIPTIONS = [
   ("ChatGPT Plus", "效率工具", 20.0, "USD", "monthly"),
@@ -144,10 +284,84 @@ def prepare_db_path():
       pass
 
 
+class ConnectionPool:
+  def __init__(self, path, size):
+    self.path = path
+    self.size = max(1, int(size))
+    self._idle = queue.LifoQueue()
+    self._slots = threading.BoundedSemaphore(self.size)
+    self._lock = threading.Lock()
+    self._opened = 0
+
+  def _open(self):
+    conn = sqlite3.connect(
+      self.path,
+      timeout=DB_BUSY_TIMEOUT_MS / 1000,
+      check_same_thread=False,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    with self._lock:
+      self._opened += 1
+    return conn
+
+  @contextmanager
+  def connection(self):
+    self._slots.acquire()
+    conn = None
+    try:
+      try:
+        conn = self._idle.get_nowait()
+      except queue.Empty:
+        conn = self._open()
+      # The connection context manager commits on success and rolls back on error,
+      # matching the semantics of the former one-shot `with sqlite3.connect(...)`.
+      with conn:
+        yield conn
+    finally:
+      if conn is not None:
+        self._idle.put(conn)
+      self._slots.release()
+
+  def reset_after_fork(self):
+    # SQLite connections must not cross fork(); a child starts with an empty pool
+    # and simply abandons anything it inherited.
+    self._idle = queue.LifoQueue()
+    self._slots = threading.BoundedSemaphore(self.size)
+    self._lock = threading.Lock()
+    self._opened = 0
+
+  def _discard(self, conn):
+    try:
+      conn.close()
+    except sqlite3.Error:
+      pass
+    with self._lock:
+      self._opened -= 1
+
+  def close_all(self):
+    while True:
+      try:
+        conn = self._idle.get_nowait()
+      except queue.Empty:
+        break
+      self._discard(conn)
+
+  def stats(self):
+    with self._lock:
+      opened = self._opened
+    return {"size": self.size, "opened": opened, "idle": self._idle.qsize()}
+
+
+DB_POOL = ConnectionPool(DB_PATH, DB_POOL_SIZE)
+
+
 def db_conn():
-  conn = sqlite3.connect(DB_PATH)
-  conn.row_factory = sqlite3.Row
-  return conn
+  return DB_POOL.connection()
 
 
 def hash_password(password, salt_hex):
@@ -156,16 +370,236 @@ def hash_password(password, salt_hex):
   return digest.hex()
 
 
-def create_password_hash(password):
+class HashingBusyError(RuntimeError):
+  def __init__(self, retry_after):
+    super().__init__("password hashing queue is full")
+    self.retry_after = retry_after
+
+
+class PasswordHasher:
+  def __init__(self, workers, queue_limit):
+    self.workers = max(1, int(workers))
+    self.queue_limit = max(0, int(queue_limit))
+    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pbkdf2")
+    self._admission = threading.BoundedSemaphore(self.workers + self.queue_limit)
+    self._lock = threading.Lock()
+    self.in_flight = 0
+    self.running = 0
+    self.completed = 0
+    self.rejected = 0
+    self.total_latency_ms = 0.0
+    self.max_latency_ms = 0.0
+
+  def _run(self, password, salt_hex):
+    with self._lock:
+      self.running += 1
+    try:
+      return hash_password(password, salt_hex)
+    finally:
+      with self._lock:
+        self.running -= 1
+
+  def hash(self, password, salt_hex, wait=False):
+    # hashlib releases the GIL inside PBKDF2, so a pool sized to the cores keeps
+    # logins from starving cheap requests while still using every core.
+    if not self._admission.acquire(blocking=wait):
+      with self._lock:
+        self.rejected += 1
+      raise HashingBusyError(PASSWORD_HASH_RETRY_AFTER_SECONDS)
+    started = time.perf_counter()
+    with self._lock:
+      self.in_flight += 1
+    try:
+      return self._executor.submit(self._run, password, salt_hex).result()
+    finally:
+      elapsed_ms = (time.perf_counter() - started) * 1000
+      with self._lock:
+        self.in_flight -= 1
+        self.completed += 1
+        self.total_latency_ms += elapsed_ms
+        self.max_latency_ms = max(self.max_latency_ms, elapsed_ms)
+      self._admission.release()
+
+  def stats(self):
+    with self._lock:
+      return {
+        "workers": self.workers,
+        "queueLimit": self.queue_limit,
+        "inFlight": self.in_flight,
+        "queueDepth": max(0, self.in_flight - self.running),
+        "completed": self.completed,
+        "rejected": self.rejected,
+        "avgLatencyMs": round(self.total_latency_ms / self.completed, 3) if self.completed else 0.0,
+        "maxLatencyMs": round(self.max_latency_ms, 3),
+      }
+
+
+PASSWORD_HASHER = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
+
+
+def create_password_hash(password, wait=False):
   salt_hex = secrets.token_hex(16)
-  return salt_hex, hash_password(password, salt_hex)
+  return salt_hex, PASSWORD_HASHER.hash(password, salt_hex, wait=wait)
 
 
-def verify_password(password, salt_hex, digest_hex):
-  calc = hash_password(password, salt_hex)
+def verify_password(password, salt_hex, digest_hex, wait=False):
+  calc = PASSWORD_HASHER.hash(password, salt_hex, wait=wait)
   return hmac.compare_digest(calc, digest_hex)
 
 
+class SessionCache:
+  def __init__(self, max_entries, ttl_seconds):
+    self.max_entries = max(0, int(max_entries))
+    self.ttl_seconds = max(0.0, float(ttl_seconds))
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidations = 0
+
+  def get(self, token):
+    now = time.time()
+    with self._lock:
+      entry = self._entries.get(token)
+      if entry is None:
+        self.misses += 1
+        return None
+      user, session_expires_at, cached_until = entry
+      if cached_until <= now or session_expires_at <= now:
+        del self._entries[token]
+        self.misses += 1
+        return None
+      self._entries.move_to_end(token)
+      self.hits += 1
+      return dict(user)
+
+  def put(self, token, user, session_expires_at):
+    if not self.max_entries or not self.ttl_seconds:
+      return
+    with self._lock:
+      self._entries[token] = (dict(user), session_expires_at, time.time() + self.ttl_seconds)
+      self._entries.move_to_end(token)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+        self.evictions += 1
+
+  def invalidate(self, token):
+    with self._lock:
+      if self._entries.pop(token, None) is not None:
+        self.invalidations += 1
+
+  def invalidate_user(self, user_id):
+    with self._lock:
+      stale = [t for t, entry in self._entries.items() if entry[0].get("id") == user_id]
+      for token in stale:
+        del self._entries[token]
+      self.invalidations += len(stale)
+
+  def stats(self):
+    with self._lock:
+      return {
+        "entries": len(self._entries),
+        "maxEntries": self.max_entries,
+        "ttlSeconds": self.ttl_seconds,
+        "hits": self.hits,
+        "misses": self.misses,
+        "evictions": self.evictions,
+        "invalidations": self.invalidations,
+      }
+
+
+SESSION_CACHE = SessionCache(SESSION_CACHE_MAX_ENTRIES, SESSION_CACHE_TTL_SECONDS)
+
+
+class CacheInvalidationBus:
+  # Prefork only. Invalidations are appended to the cache_invalidations table and
+  # the new row id is written to an 8-byte anonymous mmap shared by every worker.
+  # A request only touches SQLite when that marker differs from what the worker
+  # has already applied, so the common path is a single memory read.
+  def __init__(self):
+    self._shared = mmap.mmap(-1, 8)
+    self._lock = threading.Lock()
+    self._seen_marker = 0
+    self._applied_id = 0
+    self.published = 0
+    self.applied = 0
+
+  def _marker(self):
+    return struct.unpack("<Q", self._shared[:8])[0]
+
+  def attach(self):
+    # Called in each worker after fork: earlier invalidations are irrelevant to an
+    # empty cache.
+    with db_conn() as conn:
+      self._applied_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations").fetchone()[0]
+    self._seen_marker = self._marker()
+
+  def publish(self, scope, key):
+    with db_conn() as conn:
+      cur = conn.execute(
+        "INSERT INTO cache_invalidations (scope, cache_key, created_at) VALUES (?, ?, ?)",
+        (scope, key, now_iso()),
+      )
+    # Written after the commit, so a worker that sees the marker also sees the row.
+    self._shared[:8] = struct.pack("<Q", cur.lastrowid)
+    with self._lock:
+      self.published += 1
+
+  def poll(self):
+    marker = self._marker()
+    if marker == self._seen_marker:
+      return
+    with self._lock:
+      if marker == self._seen_marker:
+        return
+      with db_conn() as conn:
+        rows = conn.execute(
+          "SELECT id, scope, cache_key FROM cache_invalidations WHERE id > ? ORDER BY id",
+          (self._applied_id,),
+        ).fetchall()
+      for row in rows:
+        if row["scope"] == "user":
+          SESSION_CACHE.invalidate_user(row["cache_key"])
+        elif row["scope"] == "fx":
+          # The leader persisted a fresh snapshot; followers load it now.
+          FX_SYNCER.wake()
+        elif row["scope"] == "icon":
+          # The next read refills from the shared icon_cache table.
+          ICON_MEMORY_CACHE.invalidate(row["cache_key"])
+        else:
+          SESSION_CACHE.invalidate(row["cache_key"])
+        self._applied_id = row["id"]
+      self.applied += len(rows)
+      self._seen_marker = marker
+
+  def stats(self):
+    with self._lock:
+      return {"published": self.published, "applied": self.applied, "appliedId": self._applied_id}
+
+
+CACHE_BUS = None
+WORKER_INDEX = None
+
+
+def log_background(message):
+  # Background-thread reports go to stderr, tagged so prefork workers can be told apart.
+  tag = f"worker {WORKER_INDEX}, pid {os.getpid()}" if WORKER_INDEX is not None else f"pid {os.getpid()}"
+  print(f"[{tag}] {message}", file=sys.stderr, flush=True)
+
+
+def invalidate_session(token):
+  SESSION_CACHE.invalidate(token)
+  if CACHE_BUS is not None:
+    CACHE_BUS.publish("token", token)
+
+
+def invalidate_user_sessions(user_id):
+  SESSION_CACHE.invalidate_user(user_id)
+  if CACHE_BUS is not None:
+    CACHE_BUS.publish("user", user_id)
+
+
 def seed_demo_subscriptions_for_user(conn, user_id):
   today = datetime.now().date().isoformat()
   now = now_iso()
@@ -202,99 +636,193 @@ def seed_demo_subscriptions_for_user(conn, user_id):
   )
 
 
-def init_db():
-  prepare_db_path()
-  DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-  with db_conn() as conn:
-    conn.execute(
-      """
-      CREATE TABLE IF NOT EXISTS users (
-        id TEXT PRIMARY KEY,
-        username TEXT UNIQUE NOT NULL,
-        is_super_admin INTEGER NOT NULL DEFAULT 0,
-        is_disabled INTEGER NOT NULL DEFAULT 0,
-        password_salt TEXT NOT NULL,
-        password_hash TEXT NOT NULL,
-        created_at TEXT NOT NULL
-      )
-      """
+def _migrate_base_schema(conn):
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS users (
+      id TEXT PRIMARY KEY,
+      username TEXT UNIQUE NOT NULL,
+      is_super_admin INTEGER NOT NULL DEFAULT 0,
+      is_disabled INTEGER NOT NULL DEFAULT 0,
+      password_salt TEXT NOT NULL,
+      password_hash TEXT NOT NULL,
+      created_at TEXT NOT NULL
     )
-    conn.execute(
-      """
-      CREATE TABLE IF NOT EXISTS sessions (
-        token TEXT PRIMARY KEY,
-        user_id TEXT NOT NULL,
-        created_at TEXT NOT NULL,
-        expires_at TEXT NOT NULL
-      )
-      """
+    """
+  )
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+      token TEXT PRIMARY KEY,
+      user_id TEXT NOT NULL,
+      created_at TEXT NOT NULL,
+      expires_at TEXT NOT NULL
     )
-    conn.execute(
-      """
-      CREATE TABLE IF NOT EXISTS subscriptions (
-        id TEXT PRIMARY KEY,
-        user_id TEXT,
-        name TEXT NOT NULL,
-        category TEXT NOT NULL,
-        price REAL NOT NULL,
-        currency TEXT NOT NULL DEFAULT 'CNY',
-        icon_url TEXT DEFAULT '',
-        cycle TEXT NOT NULL,
-        next_payment_date TEXT NOT NULL,
-        status TEXT NOT NULL,
-        note TEXT DEFAULT '',
-        tags TEXT DEFAULT '[]',
-        deleted_at TEXT DEFAULT NULL,
-        created_at TEXT NOT NULL,
-        updated_at TEXT NOT NULL
-      )
-      """
+    """
+  )
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS subscriptions (
+      id TEXT PRIMARY KEY,
+      user_id TEXT,
+      name TEXT NOT NULL,
+      category TEXT NOT NULL,
+      price REAL NOT NULL,
+      currency TEXT NOT NULL DEFAULT 'CNY',
+      icon_url TEXT DEFAULT '',
+      cycle TEXT NOT NULL,
+      next_payment_date TEXT NOT NULL,
+      status TEXT NOT NULL,
+      note TEXT DEFAULT '',
+      tags TEXT DEFAULT '[]',
+      deleted_at TEXT DEFAULT NULL,
+      created_at TEXT NOT NULL,
+      updated_at TEXT NOT NULL
     )
-    conn.execute(
-      """
-      CREATE TABLE IF NOT EXISTS share_links (
-        token TEXT PRIMARY KEY,
-        user_id TEXT UNIQUE NOT NULL,
-        created_at TEXT NOT NULL
-      )
-      """
+    """
+  )
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS share_links (
+      token TEXT PRIMARY KEY,
+      user_id TEXT UNIQUE NOT NULL,
+      created_at TEXT NOT NULL
     )
-    conn.execute(
-      """
-      CREATE TABLE IF NOT EXISTS icon_cache (
-        cache_key TEXT PRIMARY KEY,
-        icon_url TEXT NOT NULL,
-        provider TEXT NOT NULL,
-        updated_at TEXT NOT NULL
-      )
-      """
+    """
+  )
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS icon_cache (
+      cache_key TEXT PRIMARY KEY,
+      icon_url TEXT NOT NULL,
+      provider TEXT NOT NULL,
+      updated_at TEXT NOT NULL
+    )
+    """
+  )
+
+  columns = {r["name"] for r in conn.execute("PRAGMA table_info(subscriptions)").fetchall()}
+  if "currency" not in columns:
+    conn.execute("ALTER TABLE subscriptions ADD COLUMN currency TEXT NOT NULL DEFAULT 'CNY'")
+    conn.execute("UPDATE subscriptions SET currency = 'CNY' WHERE currency IS NULL OR currency = ''")
+  if "icon_url" not in columns:
+    conn.execute("ALTER TABLE subscriptions ADD COLUMN icon_url TEXT DEFAULT ''")
+    conn.execute("UPDATE subscriptions SET icon_url = '' WHERE icon_url IS NULL")
+  if "user_id" not in columns:
+    conn.execute("ALTER TABLE subscriptions ADD COLUMN user_id TEXT")
+  if "tags" not in columns:
+    conn.execute("ALTER TABLE subscriptions ADD COLUMN tags TEXT DEFAULT '[]'")
+    conn.execute("UPDATE subscriptions SET tags = '[]' WHERE tags IS NULL OR tags = ''")
+  if "deleted_at" not in columns:
+    conn.execute("ALTER TABLE subscriptions ADD COLUMN deleted_at TEXT DEFAULT NULL")
+
+  user_columns = {r["name"] for r in conn.execute("PRAGMA table_info(users)").fetchall()}
+  if "is_super_admin" not in user_columns:
+    conn.execute("ALTER TABLE users ADD COLUMN is_super_admin INTEGER NOT NULL DEFAULT 0")
+  if "is_disabled" not in user_columns:
+    conn.execute("ALTER TABLE users ADD COLUMN is_disabled INTEGER NOT NULL DEFAULT 0")
+
+
+def _migrate_hot_path_indexes(conn):
+  # /api/subscriptions, the share page and the admin per-user count all filter on
+  # live rows of one user; the partial index keeps soft-deleted rows out of it.
+  conn.execute(
+    """
+    CREATE INDEX IF NOT EXISTS idx_subscriptions_user_live
+    ON subscriptions (user_id, next_payment_date)
+    WHERE deleted_at IS NULL
+    """
+  )
+  conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+  conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions (user_id)")
+  conn.execute("CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at)")
+  conn.execute(
+    "CREATE INDEX IF NOT EXISTS idx_users_super_admin ON users (username) WHERE is_super_admin = 1"
+  )
+
+
+def _migrate_fx_persistence(conn):
+  # scope is "tracked" for FX_CACHE (the app currencies, labelled with the merged
+  # source) and "catalog" for the merged full provider table behind OPEN_ER_CACHE.
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS fx_rates (
+      snapshot_date TEXT NOT NULL,
+      scope TEXT NOT NULL,
+      source TEXT NOT NULL,
+      code TEXT NOT NULL,
+      usd_rate REAL NOT NULL,
+      fetched_at TEXT NOT NULL,
+      PRIMARY KEY (snapshot_date, scope, source, code)
+    )
+    """
+  )
+  conn.execute("CREATE INDEX IF NOT EXISTS idx_fx_rates_scope_fetched ON fx_rates (scope, fetched_at)")
+  conn.execute("CREATE INDEX IF NOT EXISTS idx_fx_rates_code_date ON fx_rates (code, snapshot_date)")
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS currency_names (
+      code TEXT PRIMARY KEY,
+      name TEXT NOT NULL,
+      updated_at TEXT NOT NULL
+    )
+    """
+  )
+
+
+def _migrate_cache_invalidations(conn):
+  # Log of session cache invalidations, replayed by the other prefork workers.
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS cache_invalidations (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      scope TEXT NOT NULL,
+      cache_key TEXT NOT NULL,
+      created_at TEXT NOT NULL
     )
+    """
+  )
+  conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_invalidations_created_at ON cache_invalidations (created_at)")
 
-    columns = {r["name"] for r in conn.execute("PRAGMA table_info(subscriptions)").fetchall()}
-    if "currency" not in columns:
-      conn.execute("ALTER TABLE subscriptions ADD COLUMN currency TEXT NOT NULL DEFAULT 'CNY'")
-      conn.execute("UPDATE subscriptions SET currency = 'CNY' WHERE currency IS NULL OR currency = ''")
-    if "icon_url" not in columns:
-      conn.execute("ALTER TABLE subscriptions ADD COLUMN icon_url TEXT DEFAULT ''")
-      conn.execute("UPDATE subscriptions SET icon_url = '' WHERE icon_url IS NULL")
-    if "user_id" not in columns:
-      conn.execute("ALTER TABLE subscriptions ADD COLUMN user_id TEXT")
-    if "tags" not in columns:
-      conn.execute("ALTER TABLE subscriptions ADD COLUMN tags TEXT DEFAULT '[]'")
-      conn.execute("UPDATE subscriptions SET tags = '[]' WHERE tags IS NULL OR tags = ''")
-    if "deleted_at" not in columns:
-      conn.execute("ALTER TABLE subscriptions ADD COLUMN deleted_at TEXT DEFAULT NULL")
-
-    user_columns = {r["name"] for r in conn.execute("PRAGMA table_info(users)").fetchall()}
-    if "is_super_admin" not in user_columns:
-      conn.execute("ALTER TABLE users ADD COLUMN is_super_admin INTEGER NOT NULL DEFAULT 0")
-    if "is_disabled" not in user_columns:
-      conn.execute("ALTER TABLE users ADD COLUMN is_disabled INTEGER NOT NULL DEFAULT 0")
+
+SCHEMA_MIGRATIONS = [
+  _migrate_base_schema,
+  _migrate_hot_path_indexes,
+  _migrate_fx_persistence,
+  _migrate_cache_invalidations,
+]
+
+
+def migrate_db(conn):
+  version = conn.execute("PRAGMA user_version").fetchone()[0]
+  if version >= len(SCHEMA_MIGRATIONS):
+    return version
+  conn.commit()
+  for target in range(version + 1, len(SCHEMA_MIGRATIONS) + 1):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+      # Re-check under the write lock in case another process migrated meanwhile.
+      current = conn.execute("PRAGMA user_version").fetchone()[0]
+      if current < target:
+        SCHEMA_MIGRATIONS[target - 1](conn)
+        conn.execute(f"PRAGMA user_version = {int(target)}")
+      conn.execute("COMMIT")
+    except Exception:
+      conn.execute("ROLLBACK")
+      raise
+  return len(SCHEMA_MIGRATIONS)
+
+
+def init_db():
+  prepare_db_path()
+  DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+  with db_conn() as conn:
+    migrate_db(conn)
 
     row = conn.execute("SELECT id FROM users WHERE username = ?", (SUPER_ADMIN_USERNAME,)).fetchone()
     if not row:
       user_id = secrets.token_hex(8)
-      salt_hex, pass_hex = create_password_hash(SUPER_ADMIN_PASSWORD)
+      salt_hex, pass_hex = create_password_hash(SUPER_ADMIN_PASSWORD, wait=True)
       created = now_iso()
       conn.execute(
         "INSERT INTO users (id, username, is_super_admin, password_salt, password_hash, created_at) VALUES (?, ?, ?, ?, ?, ?)",
@@ -303,9 +831,14 @@ def init_db():
     else:
       user_id = row["id"]
 
-    conn.execute("UPDATE users SET is_super_admin = 0 WHERE username <> ?", (SUPER_ADMIN_USERNAME,))
-    conn.execute("UPDATE users SET is_super_admin = 1 WHERE username = ?", (SUPER_ADMIN_USERNAME,))
-    conn.execute("UPDATE users SET is_disabled = 0 WHERE username = ?", (SUPER_ADMIN_USERNAME,))
+    conn.execute(
+      "UPDATE users SET is_super_admin = 0 WHERE is_super_admin = 1 AND username <> ?",
+      (SUPER_ADMIN_USERNAME,),
+    )
+    conn.execute(
+      "UPDATE users SET is_super_admin = 1, is_disabled = 0 WHERE username = ? AND (is_super_admin <> 1 OR is_disabled <> 0)",
+      (SUPER_ADMIN_USERNAME,),
+    )
 
     sub_count = conn.execute(
       "SELECT COUNT(1) AS c FROM subscriptions WHERE user_id = ? AND deleted_at IS NULL",
@@ -314,8 +847,6 @@ def init_db():
     if int(sub_count or 0) == 0:
       seed_demo_subscriptions_for_user(conn, user_id)
 
-    conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now_iso(),))
-
 
 def normalize_currency(value):
   code = (value or "CNY").strip().upper()
@@ -326,20 +857,261 @@ def normalize_currency(value):
   return code
 
 
+SERVICE_TEXT_STRIP_RE = re.compile(r"[^a-z0-9\u4e00-\u9fff]+")
+SERVICE_SLUG_STRIP_RE = re.compile(r"[^a-z0-9]+")
+SERVICE_SLUG_SUFFIX_RE = re.compile(r"(plus|premium|pro|official|app)$")
+
+
 def normalize_service_text(value):
-  text = (value or "").strip().lower()
-  text = re.sub(r"[^a-z0-9\u4e00-\u9fff]+", " ", text)
-  text = re.sub(r"\s+", " ", text).strip()
-  return text
+  # Runs of stripped characters collapse to one space, so no second whitespace pass is needed.
+  return SERVICE_TEXT_STRIP_RE.sub(" ", (value or "").strip().lower()).strip()
 
 
 def slugify_service_name(value):
-  text = (value or "").strip().lower()
-  text = re.sub(r"[^a-z0-9]+", "", text)
-  return text
+  return SERVICE_SLUG_STRIP_RE.sub("", (value or "").strip().lower())
+
+
+class KeywordMatcher:
+  # Aho-Corasick automaton: one pass over the text reports every keyword that
+  # occurs in it, overlapping ones included, regardless of how many keywords exist.
+  def __init__(self, keywords):
+    self.keywords = list(keywords)
+    self._goto = [{}]
+    self._fail = [0]
+    self._out = [[]]
+    for index, keyword in enumerate(self.keywords):
+      if not keyword:
+        continue
+      state = 0
+      for ch in keyword:
+        nxt = self._goto[state].get(ch)
+        if nxt is None:
+          nxt = len(self._goto)
+          self._goto[state][ch] = nxt
+          self._goto.append({})
+          self._fail.append(0)
+          self._out.append([])
+        state = nxt
+      self._out[state].append(index)
+
+    pending = list(self._goto[0].values())
+    while pending:
+      next_pending = []
+      for state in pending:
+        for ch, nxt in self._goto[state].items():
+          fallback = self._fail[state]
+          while fallback and ch not in self._goto[fallback]:
+            fallback = self._fail[fallback]
+          target = self._goto[fallback].get(ch, 0)
+          self._fail[nxt] = target
+          self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+          next_pending.append(nxt)
+      pending = next_pending
+
+  def find(self, *texts):
+    found = set()
+    for text in texts:
+      state = 0
+      for ch in text or "":
+        while state and ch not in self._goto[state]:
+          state = self._fail[state]
+        state = self._goto[state].get(ch, 0)
+        if self._out[state]:
+          found.update(self._out[state])
+    return found
+
+
+class ServiceCatalog:
+  def __init__(self, hints, aliases):
+    self.hints = [dict(item, keyword=str(item.get("keyword", "")).strip().lower()) for item in hints]
+    self.hints = [item for item in self.hints if item["keyword"]]
+    self.aliases = [(key, list(values)) for key, values in aliases.items() if key]
+    self._hint_matcher = KeywordMatcher(item["keyword"] for item in self.hints)
+    self._alias_matcher = KeywordMatcher(key.lower() for key, _ in self.aliases)
+
+  def match_hints(self, normalized):
+    # Matches come back in catalog order, which is also the hint priority.
+    return [self.hints[i] for i in sorted(self._hint_matcher.find(normalized))]
+
+  def match_aliases(self, name, normalized):
+    return [self.aliases[i] for i in sorted(self._alias_matcher.find((name or "").lower(), normalized))]
+
+  def stats(self):
+    return {"hints": len(self.hints), "aliases": len(self.aliases)}
+
+
+def load_service_catalog(path=""):
+  # A JSON data file of the form {"hints": [...], "aliases": {...}} extends the
+  # built-in catalog; file entries are appended after the built-in ones.
+  hints = list(SERVICE_ICON_HINTS)
+  aliases = dict(SERVICE_NAME_ALIASES)
+  if path:
+    catalog_path = Path(path)
+    if not catalog_path.is_absolute():
+      catalog_path = BASE_DIR / catalog_path
+    data = json.loads(catalog_path.read_text(encoding="utf-8"))
+    hints.extend(item for item in data.get("hints", []) if isinstance(item, dict))
+    for key, values in (data.get("aliases") or {}).items():
+      if isinstance(values, str):
+        values = [values]
+      aliases[str(key)] = [str(v) for v in values]
+  return ServiceCatalog(hints, aliases)
+
+
+SERVICE_CATALOG = load_service_catalog(SERVICE_CATALOG_PATH)
+
+
+class _Flight:
+  __slots__ = ("done", "result", "error")
+
+  def __init__(self):
+    self.done = threading.Event()
+    self.result = None
+    self.error = None
+
+
+class SingleFlight:
+  def __init__(self, name):
+    self.name = name
+    self._lock = threading.Lock()
+    self._flights = {}
+    self.leaders = 0
+    self.shared = 0
+    self.skipped = 0
+
+  def do(self, key, func, wait=True, default=None):
+    # One call per key runs at a time; concurrent callers share its outcome, or
+    # with wait=False return `default` at once so they can serve the old value.
+    with self._lock:
+      flight = self._flights.get(key)
+      leader = flight is None
+      if leader:
+        flight = _Flight()
+        self._flights[key] = flight
+        self.leaders += 1
+      elif wait:
+        self.shared += 1
+      else:
+        self.skipped += 1
+    if not leader:
+      if not wait:
+        return default
+      flight.done.wait()
+      if flight.error is not None:
+        raise flight.error
+      return flight.result
+    try:
+      flight.result = func()
+      return flight.result
+    except BaseException as err:
+      flight.error = err
+      raise
+    finally:
+      with self._lock:
+        self._flights.pop(key, None)
+      flight.done.set()
+
+  def stats(self):
+    with self._lock:
+      return {
+        "inFlight": len(self._flights),
+        "leaders": self.leaders,
+        "shared": self.shared,
+        "skipped": self.skipped,
+      }
+
+
+ICON_FLIGHTS = SingleFlight("icons")
+ICON_PROBE_POOL = ThreadPoolExecutor(max_workers=max(1, ICON_PROBE_WORKERS), thread_name_prefix="icon-probe")
+ICON_BATCH_POOL = ThreadPoolExecutor(max_workers=max(1, ICON_BATCH_WORKERS), thread_name_prefix="icon-batch")
+ICON_BATCH_LOCK = threading.Lock()
+ICON_BATCH_STATS = {
+  "pending": 0,
+  "submitted": 0,
+  "rejected": 0,
+  "cancelled": 0,
+}
+ICON_PROBE_LOCK = threading.Lock()
+ICON_PROBE_STATS = {
+  "resolves": 0,
+  "probes": 0,
+  "cancelled": 0,
+  "deadlineExceeded": 0,
+  "inconclusive": 0,
+}
+FX_FLIGHTS = SingleFlight("fx")
+
+
+class IconMemoryCache:
+  def __init__(self, max_entries):
+    self.max_entries = max(0, int(max_entries))
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+    self.evictions = 0
+
+  def get(self, cache_key):
+    with self._lock:
+      entry = self._entries.get(cache_key)
+      if entry is None:
+        return None
+      value, expires_at = entry
+      if expires_at <= time.time():
+        del self._entries[cache_key]
+        return None
+      self._entries.move_to_end(cache_key)
+      return dict(value)
+
+  def put(self, cache_key, value, expires_at):
+    if not self.max_entries:
+      return
+    with self._lock:
+      self._entries[cache_key] = (dict(value), expires_at)
+      self._entries.move_to_end(cache_key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+        self.evictions += 1
+
+  def invalidate(self, cache_key):
+    with self._lock:
+      self._entries.pop(cache_key, None)
+
+  def __len__(self):
+    with self._lock:
+      return len(self._entries)
+
+
+ICON_MEMORY_CACHE = IconMemoryCache(ICON_MEMORY_CACHE_MAX_ENTRIES)
+ICON_CACHE_LOCK = threading.Lock()
+ICON_CACHE_STATS = {
+  "memoryHits": 0,
+  "dbHits": 0,
+  "misses": 0,
+  "negativeHits": 0,
+  "negativeStores": 0,
+}
+
+
+def _count_icon_cache(field):
+  with ICON_CACHE_LOCK:
+    ICON_CACHE_STATS[field] += 1
+
+
+def _icon_cache_entry(icon_url, provider):
+  # An empty icon_url is a negative entry: the lookup found nothing and should not
+  # be repeated until its shorter TTL runs out.
+  entry = {"iconUrl": icon_url, "provider": provider, "cached": True}
+  if not icon_url:
+    entry["negative"] = True
+  return entry
 
 
 def icon_cache_get(cache_key):
+  if CACHE_BUS is not None:
+    CACHE_BUS.poll()
+  entry = ICON_MEMORY_CACHE.get(cache_key)
+  if entry is not None:
+    _count_icon_cache("negativeHits" if entry.get("negative") else "memoryHits")
+    return entry
   now = now_dt()
   with db_conn() as conn:
     row = conn.execute(
@@ -347,18 +1119,21 @@ def icon_cache_get(cache_key):
       (cache_key,),
     ).fetchone()
   if not row:
+    _count_icon_cache("misses")
     return None
   try:
     updated = parse_iso(row["updated_at"])
   except Exception:
+    _count_icon_cache("misses")
     return None
-  if (now - updated).total_seconds() > ICON_CACHE_TTL_SECONDS:
+  ttl = ICON_CACHE_TTL_SECONDS if row["icon_url"] else ICON_NEGATIVE_TTL_SECONDS
+  if (now - updated).total_seconds() > ttl:
+    _count_icon_cache("misses")
     return None
-  return {
-    "iconUrl": row["icon_url"],
-    "provider": row["provider"],
-    "cached": True,
-  }
+  entry = _icon_cache_entry(row["icon_url"], row["provider"])
+  ICON_MEMORY_CACHE.put(cache_key, entry, updated.timestamp() + ttl)
+  _count_icon_cache("negativeHits" if entry.get("negative") else "dbHits")
+  return entry
 
 
 def icon_cache_set(cache_key, icon_url, provider):
@@ -375,23 +1150,250 @@ def icon_cache_set(cache_key, icon_url, provider):
       """,
       (cache_key, icon_url, provider, ts),
     )
+  ttl = ICON_CACHE_TTL_SECONDS if icon_url else ICON_NEGATIVE_TTL_SECONDS
+  ICON_MEMORY_CACHE.put(cache_key, _icon_cache_entry(icon_url, provider), time.time() + ttl)
+  if CACHE_BUS is not None:
+    # Other workers drop their copy, including negative entries, and reread the table.
+    CACHE_BUS.publish("icon", cache_key)
+  if not icon_url:
+    _count_icon_cache("negativeStores")
+
+
+def icon_cache_stats():
+  with ICON_CACHE_LOCK:
+    stats = dict(ICON_CACHE_STATS)
+  stats["memoryEntries"] = len(ICON_MEMORY_CACHE)
+  stats["memoryMaxEntries"] = ICON_MEMORY_CACHE.max_entries
+  stats["memoryEvictions"] = ICON_MEMORY_CACHE.evictions
+  return stats
+
+
+class HttpResponse:
+  __slots__ = ("url", "status", "reason", "headers", "body", "truncated")
+
+  def __init__(self, url, status, reason, headers, body, truncated=False):
+    self.url = url
+    self.status = status
+    self.reason = reason
+    self.headers = headers
+    self.body = body
+    self.truncated = truncated
+
+  def content_type(self):
+    return (self.headers.get("Content-Type") or "").lower()
+
+
+class HttpClient:
+  # Shared outbound client: keeps idle keep-alive connections per (scheme, host,
+  # port), follows redirects, retries idempotent failures within the caller's
+  # deadline, and records per-host latency. Failures surface as URLError (HTTPError
+  # for error statuses), like urlopen.
+  def __init__(self, max_idle_per_host, idle_seconds):
+    self.max_idle_per_host = max(0, max_idle_per_host)
+    self.idle_seconds = idle_seconds
+    self._ssl_context = ssl.create_default_context()
+    self._proxies = getproxies()
+    self._lock = threading.Lock()
+    self._idle = {}
+    self._hosts = {}
+
+  def _host_stats(self, host):
+    stats = self._hosts.get(host)
+    if stats is None:
+      stats = {"requests": 0, "errors": 0, "opened": 0, "reused": 0, "totalMs": 0.0, "maxMs": 0.0}
+      self._hosts[host] = stats
+    return stats
+
+  def _record(self, host, started, error=False, opened=False):
+    elapsed_ms = (time.monotonic() - started) * 1000
+    with self._lock:
+      stats = self._host_stats(host)
+      stats["requests"] += 1
+      stats["errors"] += int(error)
+      stats["opened" if opened else "reused"] += 1
+      stats["totalMs"] += elapsed_ms
+      stats["maxMs"] = max(stats["maxMs"], elapsed_ms)
+
+  def _checkout(self, key):
+    now = time.monotonic()
+    with self._lock:
+      idle = self._idle.get(key) or []
+      while idle:
+        conn, absolute, released_at = idle.pop()
+        if now - released_at < self.idle_seconds:
+          return conn, absolute
+        conn.close()
+    return None, False
+
+  def _checkin(self, key, conn, absolute):
+    # absolute: the connection goes to a plain-HTTP proxy and needs absolute-form targets.
+    with self._lock:
+      idle = self._idle.setdefault(key, [])
+      if len(idle) < self.max_idle_per_host:
+        idle.append((conn, absolute, time.monotonic()))
+        return
+    conn.close()
+
+  def _proxy_for(self, scheme, host):
+    proxy = self._proxies.get(scheme)
+    if not proxy or proxy_bypass(host):
+      return None
+    return urlparse(proxy if "://" in proxy else f"http://{proxy}")
+
+  def _connect(self, scheme, host, port, timeout):
+    proxy = self._proxy_for(scheme, host)
+    if proxy is not None:
+      if scheme == "https":
+        conn = HTTPSConnection(proxy.hostname, proxy.port or 80, timeout=timeout, context=self._ssl_context)
+        conn.set_tunnel(host, port)
+        return conn, False
+      # Plain HTTP goes through the proxy with an absolute request target.
+      return HTTPConnection(proxy.hostname, proxy.port or 80, timeout=timeout), True
+    if scheme == "https":
+      return HTTPSConnection(host, port, timeout=timeout, context=self._ssl_context), False
+    return HTTPConnection(host, port, timeout=timeout), False
+
+  def _send_once(self, method, url, headers, timeout, max_bytes):
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    if scheme not in {"http", "https"} or not parsed.hostname:
+      raise URLError(f"unsupported url: {url}")
+    host = parsed.hostname
+    port = parsed.port or (443 if scheme == "https" else 80)
+    key = (scheme, host, port)
+    target = parsed.path or "/"
+    if parsed.query:
+      target = f"{target}?{parsed.query}"
+
+    conn, absolute = self._checkout(key)
+    while True:
+      opened = conn is None
+      if opened:
+        conn, absolute = self._connect(scheme, host, port, timeout)
+      else:
+        conn.timeout = timeout
+        if conn.sock is not None:
+          conn.sock.settimeout(timeout)
+      started = time.monotonic()
+      try:
+        conn.request(method, url if absolute else target, headers=headers)
+        resp = conn.getresponse()
+        body = resp.read() if max_bytes is None else resp.read(max_bytes + 1)
+      except (RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+        conn.close()
+        if not opened:
+          # The server dropped an idle pooled connection; retry once on a fresh one.
+          conn = None
+          continue
+        self._record(host, started, error=True, opened=opened)
+        raise
+      except (OSError, HTTPException):
+        conn.close()
+        self._record(host, started, error=True, opened=opened)
+        raise
+      truncated = max_bytes is not None and len(body) > max_bytes
+      if truncated or resp.will_close or not resp.isclosed():
+        conn.close()
+      else:
+        self._checkin(key, conn, absolute)
+      self._record(host, started, error=resp.status >= 500, opened=opened)
+      return HttpResponse(url, resp.status, resp.reason, resp.headers, body[:max_bytes] if truncated else body, truncated)
+
+  def _send(self, method, url, headers, timeout, max_bytes, redirects):
+    for _ in range(redirects + 1):
+      resp = self._send_once(method, url, headers, timeout, max_bytes)
+      location = resp.headers.get("Location")
+      if resp.status not in {301, 302, 303, 307, 308} or not location:
+        return resp
+      if resp.status == 303 or (resp.status in {301, 302} and method == "POST"):
+        method = "GET"
+      url = urljoin(url, location)
+    raise URLError(f"{url}: too many redirects")
+
+  def request(self, method, url, headers=None, timeout=10.0, deadline=None, retries=0, max_bytes=None, redirects=5):
+    merged = {"User-Agent": HTTP_USER_AGENT, **(headers or {})}
+    attempts = 1 + max(0, retries)
+    last_err = None
+    for attempt in range(attempts):
+      budget = timeout
+      if deadline is not None:
+        budget = min(budget, deadline - time.monotonic())
+      if budget <= 0:
+        break
+      try:
+        resp = self._send(method, url, merged, budget, max_bytes, redirects)
+      except URLError:
+        # Bad URLs and redirect loops will not improve on retry.
+        raise
+      except (OSError, HTTPException) as err:
+        last_err = err
+      else:
+        if resp.status < 400:
+          return resp
+        if resp.status not in HTTP_RETRY_STATUSES or attempt + 1 >= attempts:
+          raise HTTPError(resp.url, resp.status, resp.reason, resp.headers, None)
+        last_err = f"HTTP {resp.status}"
+      if attempt + 1 < attempts:
+        pause = 0.25 * (attempt + 1)
+        if deadline is not None:
+          pause = min(pause, max(0.0, deadline - time.monotonic()))
+        time.sleep(pause)
+    raise URLError(f"{url}: {last_err or 'deadline exceeded'}")
+
+  def stats(self):
+    with self._lock:
+      hosts = [
+        {
+          "host": host,
+          **stats,
+          "totalMs": round(stats["totalMs"], 1),
+          "maxMs": round(stats["maxMs"], 1),
+          "avgMs": round(stats["totalMs"] / stats["requests"], 1) if stats["requests"] else 0.0,
+        }
+        for host, stats in self._hosts.items()
+      ]
+      idle = sum(len(conns) for conns in self._idle.values())
+    hosts.sort(key=lambda item: item["requests"], reverse=True)
+    return {"idleConnections": idle, "hosts": hosts[:50]}
+
+
+HTTP_CLIENT = HttpClient(HTTP_POOL_MAX_IDLE_PER_HOST, HTTP_POOL_IDLE_SECONDS)
+
+
+def _probe_timeout(limit, deadline):
+  if deadline is None:
+    return limit
+  remaining = deadline - time.monotonic()
+  if remaining <= 0:
+    raise TimeoutError("icon resolve deadline exceeded")
+  return min(limit, remaining)
 
 
-def check_icon_url(url):
-  req = Request(
+def _is_icon_type(ctype):
+  return "image" in ctype or "svg" in ctype or "icon" in ctype
+
+
+def check_icon_url(url, deadline=None):
+  headers = {"Accept": "image/*,*/*;q=0.8"}
+  try:
+    resp = HTTP_CLIENT.request("HEAD", url, headers=headers, timeout=_probe_timeout(4, deadline))
+    if _is_icon_type(resp.content_type()):
+      return True
+  except HTTPError as err:
+    if err.code not in {403, 405, 501}:
+      raise
+  # HEAD was refused or inconclusive: fetch only the first bytes.
+  resp = HTTP_CLIENT.request(
+    "GET",
     url,
-    headers={
-      "User-Agent": "Subly/1.0 (+https://localhost)",
-      "Accept": "image/*,*/*;q=0.8",
-    },
+    headers={**headers, "Range": "bytes=0-511"},
+    timeout=_probe_timeout(4, deadline),
+    max_bytes=512,
   )
-  with urlopen(req, timeout=4) as resp:
-    ctype = (resp.headers.get("Content-Type") or "").lower()
-    if "image" in ctype or "svg" in ctype or "icon" in ctype:
-      return True
-    # Some favicon endpoints omit content-type. Probe body as fallback.
-    body = resp.read(64)
-    return bool(body)
+  if _is_icon_type(resp.content_type()):
+    return True
+  # Some favicon endpoints omit content-type. Probe body as fallback.
+  return bool(resp.body)
 
 
 def build_icon_candidates(name, category=""):
@@ -407,31 +1409,29 @@ def build_icon_candidates(name, category=""):
     seen.add(key)
     candidates.append((url, provider))
 
-  for item in SERVICE_ICON_HINTS:
-    if item["keyword"] in n:
-      add(item.get("icon", ""), "hint-simpleicons")
-      domain = item.get("domain", "")
-      if domain:
-        add(f"https://www.google.com/s2/favicons?sz=128&domain={quote(domain)}", "google-favicon")
-        add(f"https://icons.duckduckgo.com/ip3/{quote(domain)}.ico", "duckduckgo-favicon")
-
-  for alias_key, alias_values in SERVICE_NAME_ALIASES.items():
-    if alias_key in (name or "") or alias_key.lower() in n:
-      for alias in alias_values:
-        add(f"https://cdn.simpleicons.org/{quote(alias)}", "alias-simpleicons")
-        add(f"https://cdn.jsdelivr.net/npm/simple-icons/icons/{quote(alias)}.svg", "alias-simpleicons-jsdelivr")
-        for tld in ("com", "cn", "io", "ai", "app"):
-          domain = f"{alias}.{tld}"
-          add(f"https://www.google.com/s2/favicons?sz=128&domain={quote(domain)}", "alias-google-favicon")
-          add(f"https://icons.duckduckgo.com/ip3/{quote(domain)}.ico", "alias-ddg-favicon")
+  for item in SERVICE_CATALOG.match_hints(n):
+    add(item.get("icon", ""), "hint-simpleicons")
+    domain = item.get("domain", "")
+    if domain:
+      add(f"https://www.google.com/s2/favicons?sz=128&domain={quote(domain)}", "google-favicon")
+      add(f"https://icons.duckduckgo.com/ip3/{quote(domain)}.ico", "duckduckgo-favicon")
+
+  for _, alias_values in SERVICE_CATALOG.match_aliases(name, n):
+    for alias in alias_values:
+      add(f"https://cdn.simpleicons.org/{quote(alias)}", "alias-simpleicons")
+      add(f"https://cdn.jsdelivr.net/npm/simple-icons/icons/{quote(alias)}.svg", "alias-simpleicons-jsdelivr")
+      for tld in ("com", "cn", "io", "ai", "app"):
+        domain = f"{alias}.{tld}"
+        add(f"https://www.google.com/s2/favicons?sz=128&domain={quote(domain)}", "alias-google-favicon")
+        add(f"https://icons.duckduckgo.com/ip3/{quote(domain)}.ico", "alias-ddg-favicon")
 
   slug = slugify_service_name(name)
   if slug:
     slug_variants = [slug]
-    compact = re.sub(r"(plus|premium|pro|official|app)$", "", slug)
+    compact = SERVICE_SLUG_SUFFIX_RE.sub("", slug)
     if compact and compact != slug:
       slug_variants.append(compact)
-    first_word = re.sub(r"[^a-z0-9]+", " ", (name or "").lower()).strip().split(" ")[0]
+    first_word = SERVICE_SLUG_STRIP_RE.sub(" ", (name or "").lower()).strip().split(" ")[0]
     if first_word:
       slug_variants.append(first_word)
 
@@ -454,30 +1454,29 @@ def resolve_hint_icon(name):
   n = normalize_service_text(name)
   if not n:
     return ""
-  for item in SERVICE_ICON_HINTS:
-    keyword = item.get("keyword", "")
-    icon = item.get("icon", "")
-    if keyword and icon and keyword in n:
-      return icon
+  for item in SERVICE_CATALOG.match_hints(n):
+    if item.get("icon"):
+      return item["icon"]
   return ""
 
 
-def fetch_itunes_icon(name):
+def fetch_itunes_icon(name, countries=ITUNES_SEARCH_COUNTRIES, deadline=None):
   term = (name or "").strip()
   if not term:
     return ""
   search_urls = [
-    f"https://itunes.apple.com/search?term={quote(term)}&country=cn&entity=software&limit=8",
-    f"https://itunes.apple.com/search?term={quote(term)}&country=us&entity=software&limit=8",
+    f"https://itunes.apple.com/search?term={quote(term)}&country={quote(country)}&entity=software&limit=8"
+    for country in countries
   ]
 
   normalized_term = normalize_service_text(term).replace(" ", "")
+  last_err = None
   for url in search_urls:
     try:
-      req = Request(url, headers={"User-Agent": "Subly/1.0 (+https://localhost)"})
-      with urlopen(req, timeout=6) as resp:
-        payload = json.loads(resp.read().decode("utf-8"))
-    except (URLError, TimeoutError, ValueError, json.JSONDecodeError):
+      resp = HTTP_CLIENT.request("GET", url, timeout=_probe_timeout(6, deadline))
+      payload = json.loads(resp.body.decode("utf-8"))
+    except (URLError, TimeoutError, ValueError, json.JSONDecodeError) as err:
+      last_err = err
       continue
 
     results = payload.get("results", [])
@@ -525,44 +1524,417 @@ def fetch_itunes_icon(name):
 
     if best_url:
       return best_url
+  if last_err is not None:
+    # A failed search is not evidence that the app does not exist.
+    raise last_err
   return ""
 
 
-def resolve_icon_url(name, category=""):
-  cache_key = f"{normalize_service_text(name)}|{normalize_service_text(category)}"
+def icon_cache_key(name, category=""):
+  return f"{normalize_service_text(name)}|{normalize_service_text(category)}"
+
+
+def resolve_icon_cached(name, category=""):
+  # Answers from hints and the icon cache only; None means an upstream lookup is needed.
+  cache_key = icon_cache_key(name, category)
   if not cache_key or cache_key == "|":
     return {"iconUrl": "", "provider": "none", "cached": False}
 
   cached = icon_cache_get(cache_key)
   hint_icon = resolve_hint_icon(name)
   if hint_icon:
+    if ICON_MIRROR_ENABLED:
+      # Mirrored hints are downloaded by the upstream path, off the request thread.
+      # After a failed download the cached remote URL is served until the retry is due.
+      if cached and cached.get("provider") == "hint-simpleicons":
+        icon_url = cached.get("iconUrl")
+        if is_mirrored_icon(icon_url) or (icon_url == hint_icon and not mirror_retry_due(hint_icon)):
+          return cached
+      return None
     if not cached or cached.get("iconUrl") != hint_icon:
       icon_cache_set(cache_key, hint_icon, "hint-simpleicons")
     return {"iconUrl": hint_icon, "provider": "hint-simpleicons", "cached": False}
-  if cached:
+  return cached
+
+
+def resolve_icon_url(name, category="", deadline=None):
+  cached = resolve_icon_cached(name, category)
+  if cached is not None:
     return cached
+  cache_key = icon_cache_key(name, category)
+  # Concurrent lookups for the same service share one upstream fan-out.
+  return ICON_FLIGHTS.do(cache_key, lambda: _resolve_icon_upstream(name, category, cache_key, deadline))
+
+
+def resolve_icons_batch(items):
+  # items is [(name, category)]; results come back in the same order. Names sharing
+  # a cache key are resolved once. The batch deadline only bounds how long we wait:
+  # each lookup keeps its own resolve deadline, so queued lookups that outlive the
+  # response still finish properly in the background and land in the icon cache.
+  deadline = time.monotonic() + ICON_BATCH_DEADLINE_SECONDS
+  by_key = {}
+  for name, category in items:
+    by_key.setdefault(icon_cache_key(name, category), (name, category))
+  resolved = {}
+  futures = {}
+  for cache_key, (name, category) in by_key.items():
+    cached = resolve_icon_cached(name, category)
+    if cached is not None:
+      resolved[cache_key] = cached
+    else:
+      if not _admit_icon_batch_lookup():
+        resolved[cache_key] = {"iconUrl": "", "provider": "unavailable", "cached": False}
+        continue
+      future = ICON_BATCH_POOL.submit(resolve_icon_url, name, category)
+      future.add_done_callback(_release_icon_batch_lookup)
+      futures[future] = cache_key
+  if not futures and len(resolved) < len(by_key):
+    raise IconQueueFullError("icon batch queue is full")
+  if futures:
+    done, not_done = futures_wait(list(futures), timeout=max(0.0, deadline - time.monotonic()) + 0.5)
+    for future in done:
+      try:
+        resolved[futures[future]] = future.result()
+      except Exception:
+        resolved[futures[future]] = {"iconUrl": "", "provider": "none", "cached": False}
+    for future in not_done:
+      # Lookups that never started are dropped; running ones finish in the background.
+      future.cancel()
+      resolved[futures[future]] = {"iconUrl": "", "provider": "timeout", "cached": False}
+  return [
+    {"name": name, "category": category, **resolved[icon_cache_key(name, category)]}
+    for name, category in items
+  ]
 
-  # Priority source: App Store search usually has better coverage for Chinese app names.
+
+class IconQueueFullError(RuntimeError):
+  pass
+
+
+def _admit_icon_batch_lookup():
+  # Batch lookups outlive their response, so the backlog across all batches is capped.
+  with ICON_BATCH_LOCK:
+    if ICON_BATCH_STATS["pending"] >= ICON_BATCH_QUEUE_LIMIT:
+      ICON_BATCH_STATS["rejected"] += 1
+      return False
+    ICON_BATCH_STATS["pending"] += 1
+    ICON_BATCH_STATS["submitted"] += 1
+    return True
+
+
+def _release_icon_batch_lookup(future):
+  with ICON_BATCH_LOCK:
+    ICON_BATCH_STATS["pending"] -= 1
+    if future.cancelled():
+      ICON_BATCH_STATS["cancelled"] += 1
+
+
+class IconJobQueue:
+  def __init__(self, workers, queue_limit, retention_seconds):
+    self.workers = max(1, int(workers))
+    self.retention_seconds = max(1.0, float(retention_seconds))
+    self._queue = queue.Queue(maxsize=max(1, int(queue_limit)))
+    self._lock = threading.Lock()
+    self._jobs = {}
+    self._by_key = {}
+    self._threads = []
+    self.submitted = 0
+    self.deduplicated = 0
+    self.completed = 0
+    self.failed = 0
+    self.rejected = 0
+
+  def start(self):
+    with self._lock:
+      if self._threads:
+        return
+      for idx in range(self.workers):
+        thread = threading.Thread(target=self._work, name=f"icon-job-{idx}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+  def submit(self, name, category):
+    self.start()
+    cache_key = icon_cache_key(name, category)
+    with self._lock:
+      self._prune()
+      # Keystrokes that normalize to the same service attach to the job already queued.
+      job_id = self._by_key.get(cache_key)
+      if job_id is not None:
+        self.deduplicated += 1
+        return self._jobs[job_id]
+      job = {
+        "id": secrets.token_urlsafe(12),
+        "cache_key": cache_key,
+        "name": name,
+        "category": category,
+        "status": "pending",
+        "result": None,
+        "finished_at": 0.0,
+        "done": threading.Event(),
+      }
+      try:
+        self._queue.put_nowait(job)
+      except queue.Full as err:
+        self.rejected += 1
+        raise IconQueueFullError("icon resolve queue is full") from err
+      self._jobs[job["id"]] = job
+      self._by_key[cache_key] = job["id"]
+      self.submitted += 1
+      return job
+
+  def get(self, job_id, wait_seconds=0.0):
+    with self._lock:
+      job = self._jobs.get(job_id)
+    if job is not None and wait_seconds > 0:
+      job["done"].wait(wait_seconds)
+    return job
+
+  def _work(self):
+    while True:
+      job = self._queue.get()
+      job["status"] = "running"
+      try:
+        result = resolve_icon_url(job["name"], job["category"])
+        status = "done"
+      except Exception:
+        result = {"iconUrl": "", "provider": "none", "cached": False}
+        status = "failed"
+      with self._lock:
+        job["result"] = result
+        job["status"] = status
+        job["finished_at"] = time.time()
+        if self._by_key.get(job["cache_key"]) == job["id"]:
+          del self._by_key[job["cache_key"]]
+        if status == "done":
+          self.completed += 1
+        else:
+          self.failed += 1
+      job["done"].set()
+      self._queue.task_done()
+
+  def _prune(self):
+    cutoff = time.time() - self.retention_seconds
+    expired = [job_id for job_id, job in self._jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]
+    for job_id in expired:
+      del self._jobs[job_id]
+
+  def stats(self):
+    with self._lock:
+      return {
+        "workers": self.workers,
+        "queueDepth": self._queue.qsize(),
+        "tracked": len(self._jobs),
+        "submitted": self.submitted,
+        "deduplicated": self.deduplicated,
+        "completed": self.completed,
+        "failed": self.failed,
+        "rejected": self.rejected,
+      }
+
+
+def icon_job_json(job):
+  payload = {"jobId": job["id"], "status": job["status"]}
+  if job["result"] is not None:
+    payload.update(job["result"])
+  else:
+    payload.update({"iconUrl": "", "provider": "pending", "cached": False})
+  return payload
+
+
+ICON_JOBS = IconJobQueue(ICON_JOB_WORKERS, ICON_JOB_QUEUE_LIMIT, ICON_JOB_RETENTION_SECONDS)
+
+
+def _run_icon_probe(probe, cancel, deadline):
+  # "" is a definite miss; False means the probe errored or never ran, which says
+  # nothing about whether the icon exists.
+  if cancel.is_set():
+    return False
   try:
-    itunes_icon = fetch_itunes_icon(name)
-    if itunes_icon:
-      icon_cache_set(cache_key, itunes_icon, "itunes-search")
-      return {"iconUrl": itunes_icon, "provider": "itunes-search", "cached": False}
+    return probe(deadline) or ""
+  except HTTPError as err:
+    return "" if 400 <= err.code < 500 and err.code not in {408, 429} else False
   except Exception:
-    pass
+    return False
+
+
+def first_ranked_success(probes, deadline):
+  # Runs every probe concurrently and returns (rank, result, conclusive) for the
+  # best-ranked success: a result only wins once every higher-ranked probe has
+  # failed. At the deadline the best completed success is used and everything else
+  # is cancelled. conclusive is True only when every probe finished with a miss.
+  if not probes:
+    return None, "", True
+  cancel = threading.Event()
+  futures = [ICON_PROBE_POOL.submit(_run_icon_probe, probe, cancel, deadline) for probe in probes]
+  rank_of = {future: rank for rank, future in enumerate(futures)}
+  outcomes = [None] * len(futures)
+  next_rank = 0
+  pending = set(futures)
+  try:
+    while pending:
+      remaining = deadline - time.monotonic()
+      if remaining <= 0:
+        with ICON_PROBE_LOCK:
+          ICON_PROBE_STATS["deadlineExceeded"] += 1
+        break
+      done, pending = futures_wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+      for future in done:
+        outcomes[rank_of[future]] = future.result()
+      while next_rank < len(outcomes) and outcomes[next_rank] is not None:
+        if outcomes[next_rank]:
+          return next_rank, outcomes[next_rank], True
+        next_rank += 1
+    for rank, result in enumerate(outcomes):
+      if result:
+        return rank, result, True
+    return None, "", all(result == "" for result in outcomes)
+  finally:
+    cancel.set()
+    cancelled = sum(1 for future in futures if future.cancel())
+    with ICON_PROBE_LOCK:
+      ICON_PROBE_STATS["resolves"] += 1
+      ICON_PROBE_STATS["probes"] += len(futures)
+      ICON_PROBE_STATS["cancelled"] += cancelled
+
+
+MIRROR_RETRY_LOCK = threading.Lock()
+MIRROR_RETRY_AT = {}
+
+
+def mirror_retry_due(url):
+  with MIRROR_RETRY_LOCK:
+    return MIRROR_RETRY_AT.get(url, 0.0) <= time.time()
+
+
+def is_mirrored_icon(url):
+  return str(url or "").startswith(MIRROR_URL_PREFIX)
+
+
+def _mirror_source_url(url):
+  # Ask the source for the normalized size where it supports one: iTunes artwork
+  # encodes it in the file name, Google favicons take sz=.
+  size = ICON_MIRROR_SIZE
+  if "mzstatic.com" in url:
+    return re.sub(r"/\d+x\d+bb\.(jpg|png|webp)$", rf"/{size}x{size}bb.\1", url)
+  if "google.com/s2/favicons" in url:
+    return re.sub(r"([?&])sz=\d+", rf"\g<1>sz={size}", url)
+  return url
+
+
+def _sniff_icon_ext(raw, ctype):
+  head = raw[:512].lstrip()
+  if raw.startswith(b"\x89PNG\r\n\x1a\n"):
+    return ".png"
+  if raw.startswith(b"\xff\xd8\xff"):
+    return ".jpg"
+  if raw.startswith((b"GIF87a", b"GIF89a")):
+    return ".gif"
+  if raw.startswith(b"RIFF") and raw[8:12] == b"WEBP":
+    return ".webp"
+  if raw.startswith(b"\x00\x00\x01\x00"):
+    return ".ico"
+  if "svg" in ctype or head.startswith(b"<svg") or (head.startswith(b"<?xml") and b"<svg" in head):
+    return ".svg"
+  return ""
+
+
+def _thumbnail_icon(raw, ext):
+  # Raster icons are scaled down to ICON_MIRROR_SIZE when Pillow is installed;
+  # SVG and everything else is stored as downloaded.
+  if Image is None or ext in {".svg", ".gif"}:
+    return raw, ext
+  try:
+    with Image.open(io.BytesIO(raw)) as img:
+      if max(img.size) <= ICON_MIRROR_SIZE:
+        return raw, ext
+      img.thumbnail((ICON_MIRROR_SIZE, ICON_MIRROR_SIZE))
+      out = io.BytesIO()
+      img.convert("RGBA").save(out, format="PNG", optimize=True)
+      return out.getvalue(), ".png"
+  except Exception:
+    return raw, ext
+
+
+def mirror_icon(url, deadline=None):
+  # Returns the local /assets/mirror/ path for url, or "" when it cannot be mirrored.
+  # Failures back off for ICON_MIRROR_RETRY_SECONDS; until then the remote URL is served.
+  local_url = _download_mirror_icon(url, deadline)
+  now = time.time()
+  with MIRROR_RETRY_LOCK:
+    if local_url:
+      MIRROR_RETRY_AT.pop(url, None)
+    else:
+      if len(MIRROR_RETRY_AT) >= 4096:
+        for key in [key for key, retry_at in MIRROR_RETRY_AT.items() if retry_at <= now]:
+          del MIRROR_RETRY_AT[key]
+      MIRROR_RETRY_AT[url] = now + ICON_MIRROR_RETRY_SECONDS
+  return local_url
 
-  for url, provider in build_icon_candidates(name, category):
-    try:
-      if check_icon_url(url):
-        icon_cache_set(cache_key, url, provider)
-        return {"iconUrl": url, "provider": provider, "cached": False}
-    except Exception:
-      continue
 
+def _download_mirror_icon(url, deadline):
+  try:
+    resp = HTTP_CLIENT.request(
+      "GET",
+      _mirror_source_url(url),
+      headers={"Accept": "image/*,*/*;q=0.8"},
+      timeout=_probe_timeout(6, deadline),
+      max_bytes=ICON_MIRROR_MAX_BYTES,
+    )
+  except (URLError, TimeoutError, OSError, ValueError):
+    return ""
+  raw = resp.body
+  if not raw or resp.truncated:
+    return ""
+  ext = _sniff_icon_ext(raw, resp.content_type())
+  if not ext:
+    return ""
+  raw, ext = _thumbnail_icon(raw, ext)
+  file_name = f"{hashlib.sha256(raw).hexdigest()}{ext}"
+  path = MIRROR_DIR / file_name
+  if not path.exists():
+    MIRROR_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = MIRROR_DIR / f".{file_name}.{secrets.token_hex(4)}.tmp"
+    tmp_path.write_bytes(raw)
+    os.replace(tmp_path, path)
+  return f"{MIRROR_URL_PREFIX}{file_name}"
+
+
+def _resolve_icon_upstream(name, category, cache_key, deadline=None):
+  own_deadline = time.monotonic() + ICON_RESOLVE_DEADLINE_SECONDS
+  deadline = own_deadline if deadline is None else min(deadline, own_deadline)
+  hint_icon = resolve_hint_icon(name) if ICON_MIRROR_ENABLED else ""
+  if hint_icon:
+    icon_url = mirror_icon(hint_icon, deadline) or hint_icon
+    icon_cache_set(cache_key, icon_url, "hint-simpleicons")
+    return {"iconUrl": icon_url, "provider": "hint-simpleicons", "cached": False}
+  # Priority source: App Store search usually has better coverage for Chinese app names,
+  # so the iTunes searches rank ahead of the generated candidates.
+  ranked = [
+    ("itunes-search", lambda d, country=country: fetch_itunes_icon(name, (country,), d))
+    for country in ITUNES_SEARCH_COUNTRIES
+  ]
+  for url, provider in build_icon_candidates(name, category):
+    ranked.append((provider, lambda d, url=url: url if check_icon_url(url, d) else ""))
+
+  rank, icon_url, conclusive = first_ranked_success([probe for _, probe in ranked], deadline)
+  if icon_url:
+    provider = ranked[rank][0]
+    if ICON_MIRROR_ENABLED:
+      icon_url = mirror_icon(icon_url, deadline) or icon_url
+    icon_cache_set(cache_key, icon_url, provider)
+    return {"iconUrl": icon_url, "provider": provider, "cached": False}
+  if not conclusive:
+    with ICON_PROBE_LOCK:
+      ICON_PROBE_STATS["inconclusive"] += 1
+    # Errors or the deadline cut the lookup short: report it, but keep retrying
+    # later instead of caching "no icon" through an outage.
+    return {"iconUrl": "", "provider": "unavailable", "cached": False}
+  icon_cache_set(cache_key, "", "none")
   return {"iconUrl": "", "provider": "none", "cached": False}
 
 
-def store_uploaded_icon(file_name, mime_type, data_url):
+def _upload_mime(file_name, mime_type, data_url=""):
   mime = (mime_type or "").strip().lower()
   if mime == "image/jpg":
     mime = "image/jpeg"
@@ -584,6 +1956,27 @@ def store_uploaded_icon(file_name, mime_type, data_url):
     mime = ext_to_mime.get(ext, "")
   if mime not in ALLOWED_UPLOAD_MIME:
     raise ValueError("仅支持 PNG/JPG/WEBP/SVG")
+  return mime
+
+
+def _upload_tmp_path():
+  UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+  return UPLOAD_DIR / f".upload-{secrets.token_hex(6)}.tmp"
+
+
+def _commit_upload(tmp_path, digest, mime):
+  # Uploads are named by content hash, so identical bytes are stored once. A repeat
+  # upload refreshes the mtime to restart the GC grace period.
+  path = UPLOAD_DIR / f"{digest}{ALLOWED_UPLOAD_MIME[mime]}"
+  if path.exists():
+    os.utime(path)
+  else:
+    os.replace(tmp_path, path)
+  return f"/assets/uploads/{path.name}"
+
+
+def store_uploaded_icon(file_name, mime_type, data_url):
+  mime = _upload_mime(file_name, mime_type, data_url)
   if not data_url.startswith("data:") or ";base64," not in data_url:
     raise ValueError("无效的图片数据")
   b64 = data_url.split(";base64,", 1)[1]
@@ -594,17 +1987,35 @@ def store_uploaded_icon(file_name, mime_type, data_url):
   if not raw or len(raw) > MAX_ICON_UPLOAD_BYTES:
     raise ValueError("图片为空或超过 1MB 限制")
 
-  ext = ALLOWED_UPLOAD_MIME[mime]
-  safe = re.sub(r"[^a-zA-Z0-9._-]+", "-", (file_name or "icon").strip())[:32] or "icon"
-  upload_name = f"{safe}-{secrets.token_hex(6)}{ext}"
-  UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-  path = (UPLOAD_DIR / upload_name).resolve()
+  tmp_path = _upload_tmp_path()
   try:
-    path.relative_to(BASE_DIR.resolve())
-  except ValueError as err:
-    raise ValueError("非法上传路径") from err
-  path.write_bytes(raw)
-  return f"/assets/uploads/{upload_name}"
+    tmp_path.write_bytes(raw)
+    return _commit_upload(tmp_path, hashlib.sha256(raw).hexdigest(), mime)
+  finally:
+    tmp_path.unlink(missing_ok=True)
+
+
+def store_uploaded_icon_stream(file_name, mime_type, stream, length):
+  # Copies exactly `length` bytes from stream to disk in chunks; the caller has
+  # already checked length against MAX_ICON_UPLOAD_BYTES.
+  mime = _upload_mime(file_name, mime_type)
+  if length <= 0 or length > MAX_ICON_UPLOAD_BYTES:
+    raise ValueError("图片为空或超过 1MB 限制")
+  tmp_path = _upload_tmp_path()
+  digest = hashlib.sha256()
+  remaining = length
+  try:
+    with tmp_path.open("wb") as fh:
+      while remaining > 0:
+        chunk = stream.read(min(UPLOAD_CHUNK_BYTES, remaining))
+        if not chunk:
+          raise ValueError("上传数据不完整")
+        digest.update(chunk)
+        fh.write(chunk)
+        remaining -= len(chunk)
+    return _commit_upload(tmp_path, digest.hexdigest(), mime)
+  finally:
+    tmp_path.unlink(missing_ok=True)
 
 
 def normalize_payload(payload):
@@ -691,24 +2102,32 @@ def row_to_share_json(row):
   }
 
 
-def fetch_secondary_usd_rates(codes):
+def fetch_json(url, deadline=None, timeout=None, retries=None):
+  # Retries are bounded by the caller's deadline (time.monotonic based).
+  resp = HTTP_CLIENT.request(
+    "GET",
+    url,
+    headers={"Accept": "application/json"},
+    timeout=FX_FETCH_TIMEOUT_SECONDS if timeout is None else timeout,
+    deadline=deadline,
+    retries=FX_FETCH_RETRIES if retries is None else retries,
+  )
+  try:
+    return json.loads(resp.body.decode("utf-8"))
+  except ValueError as err:
+    raise URLError(f"{url}: {err}") from err
+
+
+def fetch_frankfurter_rates(codes, deadline=None, url=None):
   if not codes:
     return {}
   symbol_query = ",".join(sorted(set(codes)))
-  url = f"https://api.frankfurter.app/latest?from=USD&to={symbol_query}"
-  payload = None
-  try:
-    req = Request(url, headers={"User-Agent": "Subly/1.0 (+https://localhost)"})
-    with urlopen(req, timeout=6) as resp:
-      payload = json.loads(resp.read().decode("utf-8"))
-  except (URLError, TimeoutError, ValueError, json.JSONDecodeError):
-    try:
-      raw = subprocess.check_output(["curl", "-s", url], timeout=8)
-      payload = json.loads(raw.decode("utf-8"))
-    except (subprocess.SubprocessError, FileNotFoundError, json.JSONDecodeError, ValueError) as err:
-      raise URLError(str(err)) from err
-
-  rates = payload.get("rates", {})
+  base_url = url or FX_FRANKFURTER_URL
+  sep = "&" if "?" in base_url else "?"
+  payload = fetch_json(f"{base_url}{sep}from=USD&to={symbol_query}", deadline)
+  rates = payload.get("rates", {}) if isinstance(payload, dict) else {}
+  if not isinstance(rates, dict):
+    raise ValueError("invalid frankfurter payload")
   result = {}
   for code in codes:
     if code in rates and rates[code] is not None:
@@ -716,19 +2135,9 @@ def fetch_secondary_usd_rates(codes):
   return result
 
 
-def fetch_open_er_rates():
-  url = "https://open.er-api.com/v6/latest/USD"
-  payload = None
-  try:
-    with urlopen(url, timeout=6) as resp:
-      payload = json.loads(resp.read().decode("utf-8"))
-  except (URLError, TimeoutError, ValueError, json.JSONDecodeError):
-    try:
-      raw = subprocess.check_output(["curl", "-s", url], timeout=8)
-      payload = json.loads(raw.decode("utf-8"))
-    except (subprocess.SubprocessError, FileNotFoundError, json.JSONDecodeError, ValueError) as err:
-      raise URLError(str(err)) from err
-  rates = payload.get("rates", {})
+def fetch_open_er_rates(deadline=None, url=None):
+  payload = fetch_json(url or FX_OPEN_ER_URL, deadline)
+  rates = payload.get("rates", {}) if isinstance(payload, dict) else None
   if not isinstance(rates, dict):
     raise ValueError("invalid open-er-api payload")
   clean = {}
@@ -744,28 +2153,200 @@ def fetch_open_er_rates():
   return clean
 
 
+class ProviderUnavailableError(URLError):
+  pass
+
+
+class CircuitBreaker:
+  def __init__(self, failure_threshold, reset_seconds):
+    self.failure_threshold = max(1, int(failure_threshold))
+    self.reset_seconds = max(0.0, float(reset_seconds))
+    self._lock = threading.Lock()
+    self.state = "closed"
+    self.consecutive_failures = 0
+    self.opened_at = 0.0
+
+  def allow(self):
+    with self._lock:
+      if self.state == "closed":
+        return True
+      if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+        # Let exactly one trial call through; its outcome closes or re-opens the breaker.
+        self.state = "half-open"
+        return True
+      return False
+
+  def record_success(self):
+    with self._lock:
+      self.state = "closed"
+      self.consecutive_failures = 0
+
+  def record_failure(self):
+    with self._lock:
+      self.consecutive_failures += 1
+      if self.state == "half-open" or self.consecutive_failures >= self.failure_threshold:
+        self.state = "open"
+        self.opened_at = time.monotonic()
+
+
+class FxProvider(ABC):
+  # A provider missing fetch() fails at startup in build_fx_providers.
+  name = ""
+  kind = "rates"
+
+  def __init__(self):
+    self.breaker = CircuitBreaker(FX_BREAKER_FAILURES, FX_BREAKER_RESET_SECONDS)
+    self._lock = threading.Lock()
+    self.calls = 0
+    self.failures = 0
+    self.short_circuited = 0
+    self.total_latency_ms = 0.0
+    self.last_latency_ms = 0.0
+    self.last_error = ""
+
+  @abstractmethod
+  def fetch(self, deadline):
+    pass
+
+  def call(self, deadline):
+    if not self.breaker.allow():
+      with self._lock:
+        self.short_circuited += 1
+      raise ProviderUnavailableError(f"{self.name}: circuit open")
+    started = time.perf_counter()
+    try:
+      result = self.fetch(deadline)
+    except Exception as err:
+      # Any failure must report back, or a half-open breaker would never close again.
+      self._record(started, err)
+      self.breaker.record_failure()
+      raise
+    self._record(started, None)
+    self.breaker.record_success()
+    return result
+
+  def _record(self, started, error):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with self._lock:
+      self.calls += 1
+      self.total_latency_ms += elapsed_ms
+      self.last_latency_ms = round(elapsed_ms, 3)
+      if error is not None:
+        self.failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+
+  def stats(self):
+    with self._lock:
+      return {
+        "name": self.name,
+        "kind": self.kind,
+        "breaker": self.breaker.state,
+        "calls": self.calls,
+        "failures": self.failures,
+        "shortCircuited": self.short_circuited,
+        "avgLatencyMs": round(self.total_latency_ms / self.calls, 3) if self.calls else 0.0,
+        "lastLatencyMs": self.last_latency_ms,
+        "lastError": self.last_error,
+      }
+
+
+class OpenErProvider(FxProvider):
+  name = "open-er-api"
+
+  def fetch(self, deadline):
+    return fetch_open_er_rates(deadline)
+
+
+class FrankfurterProvider(FxProvider):
+  name = "frankfurter"
+
+  def fetch(self, deadline):
+    return fetch_frankfurter_rates(sorted(c for c in CURRENCY_CODES if c != "USD"), deadline)
+
+
+class OpenExchangeRatesNamesProvider(FxProvider):
+  name = "openexchangerates"
+  kind = "names"
+
+  def fetch(self, deadline):
+    return fetch_currency_names(deadline)
+
+
+class StubRatesProvider(FxProvider):
+  # Offline provider for development and benchmarks; never touches the network.
+  name = "stub"
+
+  def fetch(self, deadline):
+    return dict(STUB_USD_RATES)
+
+
+class StubNamesProvider(FxProvider):
+  name = "stub"
+  kind = "names"
+
+  def fetch(self, deadline):
+    return dict(STUB_CURRENCY_NAMES)
+
+
+FX_PROVIDER_TYPES = {
+  "rates": {
+    "open-er-api": OpenErProvider,
+    "frankfurter": FrankfurterProvider,
+    "stub": StubRatesProvider,
+  },
+  "names": {
+    "openexchangerates": OpenExchangeRatesNamesProvider,
+    "stub": StubNamesProvider,
+  },
+}
+
+
+def build_fx_providers(kind, spec):
+  providers = []
+  for raw in (spec or "").split(","):
+    name = raw.strip().lower()
+    if not name:
+      continue
+    provider_type = FX_PROVIDER_TYPES[kind].get(name)
+    if provider_type is None:
+      raise RuntimeError(f"unknown {kind} FX provider: '{name}'")
+    providers.append(provider_type())
+  if not providers:
+    raise RuntimeError(f"no {kind} FX providers configured")
+  return providers
+
+
+FX_RATE_PROVIDERS = build_fx_providers("rates", FX_RATE_PROVIDER_NAMES)
+FX_NAME_PROVIDERS = build_fx_providers("names", FX_NAME_PROVIDER_NAMES)
+
+
+def cache_refresh_due(cache, ttl_seconds, now=None):
+  now = now or time.time()
+  if now - cache["attempted_at"] < FX_REFRESH_RETRY_SECONDS:
+    return False
+  loaded_at = cache["loaded_at"]
+  if not loaded_at:
+    return True
+  return now - loaded_at >= max(0.0, ttl_seconds - FX_REFRESH_AHEAD_SECONDS)
+
+
+def request_fx_refresh(cache, ttl_seconds):
+  if not cache_refresh_due(cache, ttl_seconds):
+    return
+  if not FX_REFRESHER.wake() and not FX_SYNCER.wake():
+    # No background refresher (e.g. imported as a module): refresh inline.
+    refresh_fx_caches()
+
+
 def get_open_er_rates():
-  now = time.time()
-  if OPEN_ER_CACHE["loaded_at"] and (now - OPEN_ER_CACHE["loaded_at"] < FX_CACHE_TTL_SECONDS):
-    return OPEN_ER_CACHE["rates"]
-  rates = fetch_open_er_rates()
-  OPEN_ER_CACHE["loaded_at"] = now
-  OPEN_ER_CACHE["rates"] = rates
-  return rates
+  request_fx_refresh(OPEN_ER_CACHE, FX_CACHE_TTL_SECONDS)
+  if not OPEN_ER_CACHE["loaded_at"]:
+    raise URLError(OPEN_ER_CACHE["last_error"] or "open-er-api rates not loaded yet")
+  return OPEN_ER_CACHE["rates"]
 
 
-def fetch_currency_names():
-  url = "https://openexchangerates.org/api/currencies.json"
-  payload = None
-  try:
-    with urlopen(url, timeout=6) as resp:
-      payload = json.loads(resp.read().decode("utf-8"))
-  except (URLError, TimeoutError, ValueError, json.JSONDecodeError):
-    try:
-      raw = subprocess.check_output(["curl", "-s", url], timeout=8)
-      payload = json.loads(raw.decode("utf-8"))
-    except (subprocess.SubprocessError, FileNotFoundError, json.JSONDecodeError, ValueError) as err:
-      raise URLError(str(err)) from err
+def fetch_currency_names(deadline=None, url=None):
+  payload = fetch_json(url or FX_CURRENCY_NAMES_URL, deadline)
   if not isinstance(payload, dict):
     raise ValueError("invalid currency names payload")
   result = {}
@@ -778,64 +2359,42 @@ def fetch_currency_names():
   return result
 
 
-def get_currency_names():
-  now = time.time()
-  if CURRENCY_NAME_CACHE["loaded_at"] and (now - CURRENCY_NAME_CACHE["loaded_at"] < 24 * 60 * 60):
-    return CURRENCY_NAME_CACHE["names"]
-  names = fetch_currency_names()
-  CURRENCY_NAME_CACHE["loaded_at"] = now
-  CURRENCY_NAME_CACHE["names"] = names
-  return names
-
-
-def fetch_live_usd_rates():
-  payload_rates = get_open_er_rates()
-  frankfurter_payload_rates = {}
-  try:
-    symbols = sorted([c for c in CURRENCY_CODES if c != "USD"])
-    symbol_query = ",".join(symbols)
-    url = f"https://api.frankfurter.app/latest?from=USD&to={symbol_query}"
-    req = Request(url, headers={"User-Agent": "Subly/1.0 (+https://localhost)"})
-    with urlopen(req, timeout=6) as resp:
-      payload = json.loads(resp.read().decode("utf-8"))
-      frankfurter_payload_rates = payload.get("rates", {}) if isinstance(payload, dict) else {}
-  except (URLError, TimeoutError, ValueError, json.JSONDecodeError):
-    frankfurter_payload_rates = {}
+def get_currency_names():
+  request_fx_refresh(CURRENCY_NAME_CACHE, CURRENCY_NAME_TTL_SECONDS)
+  if not CURRENCY_NAME_CACHE["loaded_at"]:
+    raise URLError(CURRENCY_NAME_CACHE["last_error"] or "currency names not loaded yet")
+  return CURRENCY_NAME_CACHE["names"]
+
+
+def merge_usd_rates(provider_rates):
+  # provider_rates is [(provider name, rates or None)] in priority order; the first
+  # provider that has a code wins it.
+  available = [(name, table) for name, table in provider_rates if table]
+  if not available:
+    raise URLError("no FX provider returned rates")
+  primary = available[0][0]
   rates = {"USD": 1.0}
   missing_codes = []
+  contributors = []
   for code in CURRENCY_CODES:
     if code == "USD":
       continue
-    val = payload_rates.get(code)
-    if val is None:
-      val = frankfurter_payload_rates.get(code)
-    if val is None:
+    for name, table in available:
+      val = table.get(code)
+      if val is not None:
+        rates[code] = float(val)
+        if name not in contributors:
+          contributors.append(name)
+        break
+    else:
       missing_codes.append(code)
       rates[code] = float(FALLBACK_USD_RATES[code])
-      continue
-    rates[code] = float(val)
 
   if missing_codes:
-    secondary = {}
-    try:
-      secondary = fetch_secondary_usd_rates(missing_codes)
-    except (URLError, TimeoutError, ValueError, json.JSONDecodeError):
-      secondary = {}
-    if secondary:
-      unresolved = []
-      for code in missing_codes:
-        if code in secondary:
-          rates[code] = float(secondary[code])
-        else:
-          unresolved.append(code)
-      missing_codes = unresolved
-
-  if not missing_codes and any(code not in payload_rates for code in CURRENCY_CODES if code != "USD"):
-    source = "open-er-api+frankfurter"
-  elif missing_codes:
-    source = "open-er-api_partial"
+    source = f"{primary}_partial"
   else:
-    source = "open-er-api"
+    order = [name for name, _ in available]
+    source = "+".join(sorted(contributors, key=order.index))
 
   return {
     "updated_at": datetime.now(UTC).date().isoformat(),
@@ -845,80 +2404,961 @@ def fetch_live_usd_rates():
   }
 
 
-def get_usd_rates():
-  now = time.time()
-  cache_age = now - FX_CACHE["loaded_at"]
-  if FX_CACHE["loaded_at"] and str(FX_CACHE["source"]) != "fallback" and cache_age < FX_CACHE_TTL_SECONDS:
-    return {
-      "base": "USD",
-      "rates": FX_CACHE["rates"],
-      "updatedAt": FX_CACHE["updated_at"],
-      "source": FX_CACHE["source"],
-      "stale": bool(FX_CACHE.get("missing_codes")),
-      "missingCodes": FX_CACHE.get("missing_codes", []),
-    }
+def merge_catalog_rates(provider_rates):
+  catalog = {}
+  contributors = []
+  for name, table in reversed(provider_rates):
+    if table:
+      catalog.update(table)
+      contributors.insert(0, name)
+  return catalog, "+".join(contributors)
 
-  try:
-    fresh = fetch_live_usd_rates()
-    FX_CACHE["loaded_at"] = now
-    FX_CACHE["updated_at"] = fresh["updated_at"]
-    FX_CACHE["source"] = fresh["source"]
-    FX_CACHE["rates"] = fresh["rates"]
-    FX_CACHE["missing_codes"] = fresh.get("missing_codes", [])
-    return {
-      "base": "USD",
-      "rates": FX_CACHE["rates"],
-      "updatedAt": FX_CACHE["updated_at"],
-      "source": FX_CACHE["source"],
-      "stale": bool(FX_CACHE.get("missing_codes")),
-      "missingCodes": FX_CACHE.get("missing_codes", []),
-    }
-  except (URLError, TimeoutError, ValueError, json.JSONDecodeError):
-    has_cache = FX_CACHE["loaded_at"] > 0
-    if not has_cache:
-      FX_CACHE["loaded_at"] = now
-      FX_CACHE["updated_at"] = datetime.now(UTC).date().isoformat()
-      FX_CACHE["source"] = "fallback"
-      FX_CACHE["rates"] = FALLBACK_USD_RATES.copy()
-      FX_CACHE["missing_codes"] = sorted(CURRENCY_CODES)
+
+def fetch_fx_providers(jobs, deadline_seconds=None):
+  # Every provider runs concurrently and shares one deadline, so the worst case is
+  # the deadline rather than the sum of each provider's timeouts and retries.
+  deadline = time.monotonic() + (deadline_seconds or FX_FETCH_DEADLINE_SECONDS)
+  futures = {key: FX_FETCH_POOL.submit(func, deadline) for key, func in jobs.items()}
+  results = {}
+  for key, future in futures.items():
+    try:
+      results[key] = (future.result(timeout=max(0.0, deadline - time.monotonic()) + 0.5), None)
+    except FuturesTimeoutError:
+      future.cancel()
+      label = key[-1] if isinstance(key, tuple) else key
+      results[key] = (None, URLError(f"{label}: deadline exceeded"))
+    except Exception as err:
+      # One broken provider must not discard what the others returned.
+      results[key] = (None, err)
+  return results
+
+
+def fx_rates_payload():
+  with FX_CACHE_LOCK:
     return {
       "base": "USD",
       "rates": FX_CACHE["rates"],
-      "updatedAt": FX_CACHE["updated_at"],
+      "updatedAt": FX_CACHE["updated_at"] or datetime.now(UTC).date().isoformat(),
       "source": FX_CACHE["source"],
-      "stale": True,
+      "stale": bool(FX_CACHE["stale"] or FX_CACHE.get("missing_codes")),
       "missingCodes": FX_CACHE.get("missing_codes", []),
     }
 
 
+def get_usd_rates():
+  request_fx_refresh(FX_CACHE, FX_CACHE_TTL_SECONDS)
+  return fx_rates_payload()
+
+
+def build_rate_matrix(payload, catalog, base):
+  usd_rates = payload["rates"]
+  base_usd = usd_rates.get(base) or catalog.get(base)
+  if not base_usd:
+    return None
+  rates = {code: value / base_usd for code, value in usd_rates.items()}
+  rates[base] = 1.0
+  return {**payload, "base": base, "rates": rates, "requestedBase": base}
+
+
+def get_rate_matrix(base):
+  # Returns (body, etag) for /api/rates, encoded once per base per FX cache version.
+  request_fx_refresh(FX_CACHE, FX_CACHE_TTL_SECONDS)
+  with FX_CACHE_LOCK:
+    version = FX_STATE["version"]
+  with RATE_MATRIX_LOCK:
+    if RATE_MATRIX_CACHE["version"] != version:
+      RATE_MATRIX_CACHE["version"] = version
+      RATE_MATRIX_CACHE["bases"] = {}
+    entry = RATE_MATRIX_CACHE["bases"].get(base)
+  if entry is not None:
+    return entry
+  with FX_CACHE_LOCK:
+    version = FX_STATE["version"]
+    catalog = OPEN_ER_CACHE["rates"]
+  matrix = build_rate_matrix(fx_rates_payload(), catalog, base)
+  if matrix is None:
+    return None
+  body = json.dumps(matrix, ensure_ascii=False, sort_keys=True).encode("utf-8")
+  entry = (body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+  with RATE_MATRIX_LOCK:
+    if RATE_MATRIX_CACHE["version"] == version:
+      RATE_MATRIX_CACHE["bases"][base] = entry
+  return entry
+
+
+def _store_refresh(cache, values, error, persist=None):
+  if values is None:
+    # Keep serving the last good value; only flag it so clients can show it as stale.
+    with FX_CACHE_LOCK:
+      cache["stale"] = True
+      cache["last_error"] = f"{type(error).__name__}: {error}"
+      FX_STATE["version"] += 1
+    return False
+  with FX_CACHE_LOCK:
+    cache.update(values)
+    cache["loaded_at"] = time.time()
+    cache["stale"] = False
+    cache["last_error"] = ""
+    FX_STATE["version"] += 1
+  if persist is not None:
+    try:
+      persist(values)
+    except sqlite3.Error as err:
+      log_background(f"Failed to persist FX cache: {type(err).__name__}: {err}")
+    else:
+      if CACHE_BUS is not None:
+        CACHE_BUS.publish("fx", "snapshot")
+  return True
+
+
+def _first_error(results, keys):
+  for key in keys:
+    error = results.get(key, (None, None))[1]
+    if error is not None:
+      return error
+  return None
+
+
+def _refresh_fx_caches_now(force):
+  now = time.time()
+  rates_due = force or cache_refresh_due(FX_CACHE, FX_CACHE_TTL_SECONDS, now)
+  catalog_due = force or cache_refresh_due(OPEN_ER_CACHE, FX_CACHE_TTL_SECONDS, now)
+  names_due = force or cache_refresh_due(CURRENCY_NAME_CACHE, CURRENCY_NAME_TTL_SECONDS, now)
+  jobs = {}
+  if rates_due or catalog_due:
+    for provider in FX_RATE_PROVIDERS:
+      jobs[("rates", provider.name)] = provider.call
+  if names_due:
+    for provider in FX_NAME_PROVIDERS:
+      jobs[("names", provider.name)] = provider.call
+  if not jobs:
+    return False
+
+  with FX_CACHE_LOCK:
+    for due, cache in ((rates_due, FX_CACHE), (catalog_due or rates_due, OPEN_ER_CACHE), (names_due, CURRENCY_NAME_CACHE)):
+      if due:
+        cache["attempted_at"] = now
+  results = fetch_fx_providers(jobs)
+
+  if rates_due or catalog_due:
+    rate_keys = [("rates", p.name) for p in FX_RATE_PROVIDERS]
+    provider_rates = [(key[1], results[key][0]) for key in rate_keys]
+    error = _first_error(results, rate_keys)
+    catalog, catalog_source = merge_catalog_rates(provider_rates)
+    _store_refresh(
+      OPEN_ER_CACHE,
+      {"rates": catalog, "source": catalog_source} if catalog else None,
+      error,
+      lambda values: persist_fx_snapshot("catalog", values["source"], values["rates"]),
+    )
+    if rates_due:
+      try:
+        values = merge_usd_rates(provider_rates)
+      except URLError as err:
+        values, error = None, error or err
+      _store_refresh(FX_CACHE, values, error, persist_tracked_rates)
+  if names_due:
+    name_keys = [("names", p.name) for p in FX_NAME_PROVIDERS]
+    names = next((results[key][0] for key in name_keys if results[key][0]), None)
+    _store_refresh(
+      CURRENCY_NAME_CACHE,
+      {"names": names} if names else None,
+      _first_error(results, name_keys) or URLError("no currency name provider responded"),
+      lambda values: persist_currency_names(values["names"]),
+    )
+  return True
+
+
+def refresh_fx_caches(force=False):
+  # Callers that lose the race keep serving the previous value instead of queueing
+  # up behind the same upstream requests.
+  return FX_FLIGHTS.do("refresh", lambda: _refresh_fx_caches_now(force), wait=False, default=False)
+
+
+def persist_tracked_rates(values):
+  # Codes still on FALLBACK_USD_RATES were not fetched; keep them out of the history.
+  missing = set(values.get("missing_codes") or [])
+  rates = {code: rate for code, rate in values["rates"].items() if code not in missing}
+  persist_fx_snapshot("tracked", values["source"], rates)
+
+
+def persist_fx_snapshot(scope, source, rates):
+  if not rates:
+    return
+  fetched = now_iso()
+  snapshot_date = fetched[:10]
+  with db_conn() as conn:
+    conn.executemany(
+      """
+      INSERT INTO fx_rates (snapshot_date, scope, source, code, usd_rate, fetched_at)
+      VALUES (?, ?, ?, ?, ?, ?)
+      ON CONFLICT(snapshot_date, scope, source, code) DO UPDATE SET
+        usd_rate = excluded.usd_rate,
+        fetched_at = excluded.fetched_at
+      """,
+      [(snapshot_date, scope, source, code, float(rate), fetched) for code, rate in rates.items()],
+    )
+
+
+def persist_currency_names(names):
+  if not names:
+    return
+  ts = now_iso()
+  with db_conn() as conn:
+    conn.executemany(
+      """
+      INSERT INTO currency_names (code, name, updated_at)
+      VALUES (?, ?, ?)
+      ON CONFLICT(code) DO UPDATE SET
+        name = excluded.name,
+        updated_at = excluded.updated_at
+      """,
+      [(code, name, ts) for code, name in names.items()],
+    )
+
+
+def _latest_fx_snapshot(conn, scope):
+  latest = conn.execute(
+    "SELECT snapshot_date, source, fetched_at FROM fx_rates WHERE scope = ? ORDER BY fetched_at DESC LIMIT 1",
+    (scope,),
+  ).fetchone()
+  if not latest:
+    return None, {}
+  rows = conn.execute(
+    "SELECT code, usd_rate FROM fx_rates WHERE snapshot_date = ? AND scope = ? AND source = ?",
+    (latest["snapshot_date"], scope, latest["source"]),
+  ).fetchall()
+  return latest, {r["code"]: float(r["usd_rate"]) for r in rows}
+
+
+def load_persisted_fx():
+  # Warm restart: serve the last persisted snapshot until the refresher replaces it.
+  with db_conn() as conn:
+    catalog_meta, catalog = _latest_fx_snapshot(conn, "catalog")
+    tracked_meta, tracked = _latest_fx_snapshot(conn, "tracked")
+    name_rows = conn.execute("SELECT code, name, updated_at FROM currency_names").fetchall()
+  now = time.time()
+  with FX_CACHE_LOCK:
+    FX_STATE["version"] += 1
+    if catalog:
+      loaded_at = parse_iso(catalog_meta["fetched_at"]).timestamp()
+      OPEN_ER_CACHE["rates"] = catalog
+      OPEN_ER_CACHE["source"] = catalog_meta["source"]
+      OPEN_ER_CACHE["loaded_at"] = loaded_at
+      OPEN_ER_CACHE["stale"] = now - loaded_at >= FX_CACHE_TTL_SECONDS
+    if tracked:
+      loaded_at = parse_iso(tracked_meta["fetched_at"]).timestamp()
+      rates = {"USD": 1.0}
+      missing_codes = []
+      for code in CURRENCY_CODES:
+        if code == "USD":
+          continue
+        if code in tracked:
+          rates[code] = tracked[code]
+        else:
+          rates[code] = float(FALLBACK_USD_RATES[code])
+          missing_codes.append(code)
+      FX_CACHE["rates"] = rates
+      FX_CACHE["missing_codes"] = missing_codes
+      FX_CACHE["source"] = tracked_meta["source"]
+      FX_CACHE["updated_at"] = tracked_meta["snapshot_date"]
+      FX_CACHE["loaded_at"] = loaded_at
+      FX_CACHE["stale"] = now - loaded_at >= FX_CACHE_TTL_SECONDS
+    if name_rows:
+      loaded_at = max(parse_iso(r["updated_at"]).timestamp() for r in name_rows)
+      CURRENCY_NAME_CACHE["names"] = {r["code"]: r["name"] for r in name_rows}
+      CURRENCY_NAME_CACHE["loaded_at"] = loaded_at
+      CURRENCY_NAME_CACHE["stale"] = now - loaded_at >= CURRENCY_NAME_TTL_SECONDS
+
+
+def sync_persisted_fx():
+  # Prefork followers: adopt the snapshot the leader worker persisted instead of
+  # calling the providers themselves. attempted_at is set whether or not a snapshot
+  # was found, so FX_REFRESH_RETRY_SECONDS also throttles follower wake-ups.
+  load_persisted_fx()
+  now = time.time()
+  with FX_CACHE_LOCK:
+    for cache in (FX_CACHE, OPEN_ER_CACHE, CURRENCY_NAME_CACHE):
+      cache["attempted_at"] = now
+
+
+def get_rate_history(code, days):
+  since = (now_dt() - timedelta(days=days)).date().isoformat()
+  with db_conn() as conn:
+    rows = conn.execute(
+      """
+      SELECT snapshot_date, scope, source, usd_rate
+      FROM fx_rates
+      WHERE code = ? AND snapshot_date >= ?
+      ORDER BY snapshot_date ASC, scope DESC, fetched_at DESC
+      """,
+      (code, since),
+    ).fetchall()
+  # Prefer the tracked (merged) snapshot over the raw catalog for the same day.
+  history = {}
+  for r in rows:
+    history.setdefault(r["snapshot_date"], {"date": r["snapshot_date"], "source": r["source"], "usdRate": float(r["usd_rate"])})
+  return list(history.values())
+
+
+class PeriodicTask:
+  def __init__(self, name, interval_seconds, func):
+    self.name = name
+    self.interval_seconds = max(1.0, float(interval_seconds))
+    self.func = func
+    self._stop = threading.Event()
+    self._wake = threading.Event()
+    self._thread = None
+    self._lock = threading.Lock()
+    self.runs = 0
+    self.failures = 0
+    self.last_run_at = ""
+    self.last_duration_ms = 0.0
+    self.last_error = ""
+
+  def run_once(self):
+    started = time.perf_counter()
+    error = ""
+    try:
+      self.func()
+    except Exception as err:
+      error = f"{type(err).__name__}: {err}"
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with self._lock:
+      self.runs += 1
+      self.last_run_at = now_iso()
+      self.last_duration_ms = round(elapsed_ms, 3)
+      self.last_error = error
+      if error:
+        self.failures += 1
+
+  def _loop(self, run_immediately):
+    if run_immediately:
+      self.run_once()
+    while True:
+      self._wake.wait(self.interval_seconds)
+      self._wake.clear()
+      if self._stop.is_set():
+        break
+      self.run_once()
+
+  def start(self, run_immediately=False):
+    if self._thread is not None:
+      return
+    self._stop.clear()
+    self._thread = threading.Thread(target=self._loop, args=(run_immediately,), name=self.name, daemon=True)
+    self._thread.start()
+
+  def wake(self):
+    if self._thread is None:
+      return False
+    self._wake.set()
+    return True
+
+  def stop(self):
+    self._stop.set()
+    self._wake.set()
+    if self._thread is not None:
+      self._thread.join(timeout=5)
+      self._thread = None
+
+  def stats(self):
+    with self._lock:
+      return {
+        "intervalSeconds": self.interval_seconds,
+        "running": self._thread is not None,
+        "runs": self.runs,
+        "failures": self.failures,
+        "lastRunAt": self.last_run_at,
+        "lastDurationMs": self.last_duration_ms,
+        "lastError": self.last_error,
+      }
+
+
+SESSION_SWEEP_STATS = {
+  "rowsPurged": 0,
+  "lastPurged": 0,
+  "batches": 0,
+}
+SESSION_SWEEP_LOCK = threading.Lock()
+
+
+def purge_expired_sessions(batch_size=None):
+  batch = max(1, int(batch_size or SESSION_SWEEP_BATCH_SIZE))
+  cutoff = now_iso()
+  purged = 0
+  batches = 0
+  while True:
+    # Each batch is its own short write transaction so request threads are not
+    # blocked behind one large DELETE.
+    with db_conn() as conn:
+      cur = conn.execute(
+        """
+        DELETE FROM sessions
+        WHERE token IN (
+          SELECT token FROM sessions WHERE expires_at <= ? LIMIT ?
+        )
+        """,
+        (cutoff, batch),
+      )
+    count = max(0, cur.rowcount)
+    purged += count
+    batches += 1
+    if count < batch:
+      break
+  if CACHE_BUS is not None:
+    cutoff_log = (now_dt() - timedelta(seconds=CACHE_INVALIDATION_RETENTION_SECONDS)).replace(microsecond=0)
+    with db_conn() as conn:
+      conn.execute(
+        "DELETE FROM cache_invalidations WHERE created_at < ?",
+        (cutoff_log.isoformat().replace("+00:00", "Z"),),
+      )
+  with SESSION_SWEEP_LOCK:
+    SESSION_SWEEP_STATS["rowsPurged"] += purged
+    SESSION_SWEEP_STATS["lastPurged"] = purged
+    SESSION_SWEEP_STATS["batches"] += batches
+  return purged
+
+
+UPLOAD_GC_STATS = {
+  "filesRemoved": 0,
+  "bytesReclaimed": 0,
+  "lastFilesRemoved": 0,
+  "lastBytesReclaimed": 0,
+}
+UPLOAD_GC_LOCK = threading.Lock()
+
+
+def collect_upload_garbage(min_age_seconds=None):
+  # Removes uploads that no live subscription points at. Files younger than the
+  # grace period are kept: an icon is uploaded before the form using it is saved.
+  if not UPLOAD_DIR.is_dir():
+    return 0
+  min_age = UPLOAD_GC_MIN_AGE_SECONDS if min_age_seconds is None else min_age_seconds
+  with db_conn() as conn:
+    rows = conn.execute(
+      "SELECT DISTINCT icon_url FROM subscriptions WHERE deleted_at IS NULL AND icon_url LIKE '%/assets/uploads/%'"
+    ).fetchall()
+  referenced = set()
+  for row in rows:
+    match = UPLOAD_REF_RE.search(row["icon_url"] or "")
+    if match:
+      referenced.add(match.group(1))
+  cutoff = time.time() - min_age
+  removed = 0
+  reclaimed = 0
+  for path in UPLOAD_DIR.iterdir():
+    if path.name in referenced:
+      continue
+    try:
+      stat = path.stat()
+      if not path.is_file() or stat.st_mtime > cutoff:
+        continue
+      path.unlink()
+    except FileNotFoundError:
+      continue
+    removed += 1
+    reclaimed += stat.st_size
+  with UPLOAD_GC_LOCK:
+    UPLOAD_GC_STATS["filesRemoved"] += removed
+    UPLOAD_GC_STATS["bytesReclaimed"] += reclaimed
+    UPLOAD_GC_STATS["lastFilesRemoved"] = removed
+    UPLOAD_GC_STATS["lastBytesReclaimed"] = reclaimed
+  if removed:
+    log_background(f"Upload GC removed {removed} files, reclaimed {reclaimed} bytes")
+  return reclaimed
+
+
+SESSION_SWEEPER = PeriodicTask("session-sweeper", SESSION_SWEEP_INTERVAL_SECONDS, purge_expired_sessions)
+FX_REFRESHER = PeriodicTask("fx-refresher", FX_REFRESH_INTERVAL_SECONDS, refresh_fx_caches)
+UPLOAD_GC = PeriodicTask("upload-gc", UPLOAD_GC_INTERVAL_SECONDS, collect_upload_garbage)
+FX_SYNCER = PeriodicTask("fx-sync", FX_SYNC_INTERVAL_SECONDS, sync_persisted_fx)
+
+
+def encoding_quality(header, coding):
+  # RFC 9110 Accept-Encoding: an explicit entry for coding wins over "*"; q=0 refuses.
+  exact = None
+  star = None
+  for part in (header or "").split(","):
+    name, _, params = part.strip().partition(";")
+    name = name.strip().lower()
+    if name not in {coding, "*"}:
+      continue
+    q = 1.0
+    for param in params.split(";"):
+      key, _, value = param.strip().partition("=")
+      if key.strip().lower() == "q":
+        try:
+          q = float(value)
+        except ValueError:
+          q = 0.0
+    if name == coding:
+      exact = q
+    else:
+      star = q
+  q = exact if exact is not None else star
+  return max(0.0, min(1.0, q or 0.0))
+
+
+def accepts_encoding(header, coding):
+  return encoding_quality(header, coding) > 0
+
+
+def variant_etag(etag, coding):
+  # Each content-coding is a distinct representation and gets its own strong ETag.
+  if not etag or not coding:
+    return etag
+  return f'{etag[:-1]}-{coding}"'
+
+
+class StaticAsset:
+  __slots__ = ("path", "mtime_ns", "size", "content_type", "body", "gzip_body", "etag", "last_modified", "mtime")
+
+  def __init__(self, path, stat, content_type, body=None):
+    self.path = path
+    self.mtime_ns = stat.st_mtime_ns
+    self.size = stat.st_size
+    self.mtime = int(stat.st_mtime)
+    self.content_type = content_type
+    self.body = body
+    self.gzip_body = None
+    self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+    if body is None:
+      # Too large to cache: streamed from disk uncompressed, validated by size and mtime.
+      self.etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+      return
+    base_type = content_type.split(";", 1)[0].strip()
+    if len(body) >= STATIC_GZIP_MIN_BYTES and (base_type.startswith("text/") or base_type in STATIC_GZIP_TYPES):
+      compressed = gzip.compress(body, compresslevel=9, mtime=0)
+      if len(compressed) < len(body):
+        self.gzip_body = compressed
+    self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+  def nbytes(self):
+    return len(self.body or b"") + len(self.gzip_body or b"")
+
+
+class StaticAssetCache:
+  # Static files are read and gzip-compressed once, then served from memory until
+  # their mtime or size changes. The cache is bounded by entry count and total
+  # bytes; files above max_file_bytes are never cached and are streamed as-is.
+  def __init__(self, max_entries, max_bytes, max_file_bytes):
+    self.max_entries = max(1, max_entries)
+    self.max_bytes = max(0, max_bytes)
+    self.max_file_bytes = min(max_file_bytes, self.max_bytes)
+    self._lock = threading.Lock()
+    self._entries = OrderedDict()
+    self._bytes = 0
+    self.hits = 0
+    self.misses = 0
+    self.reloads = 0
+    self.evictions = 0
+    self.streamed = 0
+
+  def _drop(self, path):
+    entry = self._entries.pop(path, None)
+    if entry is not None:
+      self._bytes -= entry.nbytes()
+
+  def get(self, path, content_type):
+    try:
+      stat = path.stat()
+    except OSError:
+      stat = None
+    if stat is None or not path.is_file():
+      with self._lock:
+        self._drop(path)
+      return None
+    with self._lock:
+      entry = self._entries.get(path)
+      if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+        self._entries.move_to_end(path)
+        self.hits += 1
+        return entry
+      self.misses += 1
+      if entry is not None:
+        self.reloads += 1
+        self._drop(path)
+      if stat.st_size > self.max_file_bytes:
+        self.streamed += 1
+        return StaticAsset(path, stat, content_type)
+    try:
+      entry = StaticAsset(path, stat, content_type, path.read_bytes())
+    except OSError:
+      return None
+    with self._lock:
+      self._drop(path)
+      self._entries[path] = entry
+      self._bytes += entry.nbytes()
+      while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+        self._bytes -= self._entries.popitem(last=False)[1].nbytes()
+        self.evictions += 1
+    return entry
+
+  def stats(self):
+    with self._lock:
+      return {
+        "entries": len(self._entries),
+        "maxEntries": self.max_entries,
+        "bytes": self._bytes,
+        "maxBytes": self.max_bytes,
+        "hits": self.hits,
+        "misses": self.misses,
+        "reloads": self.reloads,
+        "evictions": self.evictions,
+        "streamed": self.streamed,
+      }
+
+
+STATIC_CACHE = StaticAssetCache(STATIC_CACHE_MAX_ENTRIES, STATIC_CACHE_MAX_BYTES, STATIC_CACHE_MAX_FILE_BYTES)
+
+JSON_COMPRESSION_LOCK = threading.Lock()
+JSON_COMPRESSION_STATS = {
+  "compressed": 0,
+  "gzip": 0,
+  "deflate": 0,
+  "bytesIn": 0,
+  "bytesOut": 0,
+  "cacheHits": 0,
+}
+# Compressed bodies of ETag'd responses (e.g. the rate matrix), keyed by (etag, coding).
+JSON_COMPRESSED_BY_ETAG = OrderedDict()
+
+
+def compress_json_body(body, coding, etag=None):
+  key = (etag, coding)
+  if etag:
+    with JSON_COMPRESSION_LOCK:
+      cached = JSON_COMPRESSED_BY_ETAG.get(key)
+      if cached is not None:
+        JSON_COMPRESSED_BY_ETAG.move_to_end(key)
+        JSON_COMPRESSION_STATS["cacheHits"] += 1
+  else:
+    cached = None
+  if cached is not None:
+    out = cached
+  elif coding == "gzip":
+    out = gzip.compress(body, compresslevel=JSON_COMPRESS_LEVEL, mtime=0)
+  else:
+    out = zlib.compress(body, JSON_COMPRESS_LEVEL)
+  with JSON_COMPRESSION_LOCK:
+    if etag and cached is None:
+      JSON_COMPRESSED_BY_ETAG[key] = out
+      while len(JSON_COMPRESSED_BY_ETAG) > 64:
+        JSON_COMPRESSED_BY_ETAG.popitem(last=False)
+    JSON_COMPRESSION_STATS["compressed"] += 1
+    JSON_COMPRESSION_STATS[coding] += 1
+    JSON_COMPRESSION_STATS["bytesIn"] += len(body)
+    JSON_COMPRESSION_STATS["bytesOut"] += len(out)
+  return out
+
+
+def json_compression_stats():
+  with JSON_COMPRESSION_LOCK:
+    stats = dict(JSON_COMPRESSION_STATS)
+  stats["bytesSaved"] = stats["bytesIn"] - stats["bytesOut"]
+  stats["minBytes"] = JSON_COMPRESS_MIN_BYTES
+  stats["level"] = JSON_COMPRESS_LEVEL
+  return stats
+
+
+def icon_probe_stats():
+  with ICON_PROBE_LOCK:
+    return {**ICON_PROBE_STATS, "workers": max(1, ICON_PROBE_WORKERS)}
+
+
+def icon_batch_stats():
+  with ICON_BATCH_LOCK:
+    return {**ICON_BATCH_STATS, "queueLimit": ICON_BATCH_QUEUE_LIMIT, "workers": max(1, ICON_BATCH_WORKERS)}
+
+
+def collect_metrics(server=None):
+  with SESSION_SWEEP_LOCK:
+    sweep = dict(SESSION_SWEEP_STATS)
+  with UPLOAD_GC_LOCK:
+    upload_gc = dict(UPLOAD_GC_STATS)
+  return {
+    "dbPool": DB_POOL.stats(),
+    "passwordHasher": PASSWORD_HASHER.stats(),
+    "sessionCache": SESSION_CACHE.stats(),
+    "singleFlight": {"fx": FX_FLIGHTS.stats(), "icons": ICON_FLIGHTS.stats()},
+    "iconCache": icon_cache_stats(),
+    "iconProbes": icon_probe_stats(),
+    "iconJobs": ICON_JOBS.stats(),
+    "iconBatch": icon_batch_stats(),
+    "staticCache": STATIC_CACHE.stats(),
+    "jsonCompression": json_compression_stats(),
+    "outboundHttp": HTTP_CLIENT.stats(),
+    "serviceCatalog": SERVICE_CATALOG.stats(),
+    "sessionSweeper": {**SESSION_SWEEPER.stats(), **sweep},
+    "uploadGc": {**UPLOAD_GC.stats(), **upload_gc},
+    "fxRefresher": {
+      **FX_REFRESHER.stats(),
+      "ratesStale": bool(FX_CACHE["stale"]),
+      "ratesSource": FX_CACHE["source"],
+      "ratesError": FX_CACHE["last_error"],
+      "openErStale": bool(OPEN_ER_CACHE["stale"]),
+      "openErError": OPEN_ER_CACHE["last_error"],
+      "currencyNamesStale": bool(CURRENCY_NAME_CACHE["stale"]),
+      "currencyNamesError": CURRENCY_NAME_CACHE["last_error"],
+    },
+    "fxSync": FX_SYNCER.stats(),
+    "fxProviders": [p.stats() for p in FX_RATE_PROVIDERS + FX_NAME_PROVIDERS],
+    "httpServer": server.stats() if hasattr(server, "stats") else {"mode": "threading"},
+    "process": {
+      "pid": os.getpid(),
+      "workerIndex": WORKER_INDEX,
+      "processes": SERVER_PROCESSES if WORKER_INDEX is not None else 1,
+      "cacheBus": CACHE_BUS.stats() if CACHE_BUS is not None else None,
+    },
+  }
+
+
 class Handler(BaseHTTPRequestHandler):
-  def _send_json(self, status_code, payload):
+  # HTTP/1.1 keep-alive: every response carries Content-Length (or is bodiless),
+  # unread request bodies are drained after the handler returns, and an idle
+  # connection is dropped after HTTP_KEEPALIVE_TIMEOUT_SECONDS.
+  protocol_version = "HTTP/1.1"
+  timeout = HTTP_KEEPALIVE_TIMEOUT_SECONDS
+  disable_nagle_algorithm = True
+
+  def setup(self):
+    super().setup()
+    self._requests_served = 0
+    self._idle_timeout = getattr(self.server, "keepalive_timeout", None)
+
+  def handle_one_request(self):
+    self._body_bytes_read = 0
+    if self._idle_timeout is not None:
+      # Pool mode: the short keep-alive timeout only covers waiting for the request line.
+      self.connection.settimeout(self._idle_timeout)
+    super().handle_one_request()
+    self._requests_served += 1
+    if not self.close_connection:
+      self._drain_request_body()
+    if not self.close_connection and getattr(self.server, "has_backlog", None) and self.server.has_backlog():
+      # A pooled worker idling on keep-alive would starve queued connections.
+      self.close_connection = True
+
+  def parse_request(self):
+    if self._idle_timeout is not None:
+      self.connection.settimeout(self.timeout)
+    return super().parse_request()
+
+  def _unread_body_bytes(self):
+    # None when the rest of the body cannot be skipped safely.
+    if getattr(self, "headers", None) is None:
+      return None
+    if self.headers.get("Transfer-Encoding"):
+      # Chunked bodies are not parsed by any handler; do not try to skip them.
+      return None
+    try:
+      remaining = int(self.headers.get("Content-Length") or 0) - self._body_bytes_read
+    except ValueError:
+      return None
+    return remaining if remaining <= HTTP_DRAIN_LIMIT_BYTES else None
+
+  def _drain_request_body(self):
+    remaining = self._unread_body_bytes()
+    if remaining is None:
+      self.close_connection = True
+      return
+    while remaining > 0:
+      chunk = self.rfile.read(min(remaining, 16 * 1024))
+      if not chunk:
+        self.close_connection = True
+        return
+      remaining -= len(chunk)
+
+  def send_response(self, code, message=None):
+    super().send_response(code, message)
+    if self._requests_served + 1 >= HTTP_KEEPALIVE_MAX_REQUESTS or self._unread_body_bytes() is None:
+      self.send_header("Connection", "close")
+
+  def send_error(self, code, message=None, explain=None):
+    # The stock version always adds "Connection: close"; plain 403/404 answers to
+    # well-formed requests keep the connection open.
+    if code not in {403, 404}:
+      super().send_error(code, message, explain)
+      return
+    short, long = self.responses.get(code, ("???", "???"))
+    message = message or short
+    body = (
+      self.error_message_format
+      % {"code": code, "message": html.escape(message, quote=False), "explain": html.escape(explain or long, quote=False)}
+    ).encode("utf-8", "replace")
+    self.log_error("code %d, message %s", code, message)
+    self.send_response(code, message)
+    self.send_header("Content-Type", self.error_content_type)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def handle_expect_100(self):
+    # Refuse oversized uploads before the client starts sending the body.
+    length = self.headers.get("Content-Length") or ""
+    if urlparse(self.path).path == "/api/icons/upload" and length.isdigit() and int(length) > MAX_ICON_UPLOAD_BYTES:
+      self.close_connection = True
+      self._send_json(413, {"error": "图片超过 1MB 限制"})
+      return False
+    return super().handle_expect_100()
+
+  def _send_json(self, status_code, payload, headers=None):
     body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    self._send_json_bytes(status_code, body, headers=headers)
+
+  def _etag_matches(self, etag):
+    header = self.headers.get("If-None-Match", "")
+    if not header:
+      return False
+    candidates = [t.strip() for t in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+  def _json_encoding(self, body):
+    if len(body) < JSON_COMPRESS_MIN_BYTES:
+      return None
+    header = self.headers.get("Accept-Encoding")
+    # Highest q wins; gzip wins ties.
+    best, best_q = None, 0.0
+    for coding in ("gzip", "deflate"):
+      q = encoding_quality(header, coding)
+      if q > best_q:
+        best, best_q = coding, q
+    return best
+
+  def _send_json_bytes(self, status_code, body, etag=None, cache_control=None, headers=None):
+    vary = len(body) >= JSON_COMPRESS_MIN_BYTES
+    coding = self._json_encoding(body)
+    if etag and any(self._etag_matches(variant_etag(etag, c)) for c in (None, "gzip", "deflate")):
+      self.send_response(304)
+      self.send_header("ETag", variant_etag(etag, coding))
+      if vary:
+        self.send_header("Vary", "Accept-Encoding")
+      if cache_control:
+        self.send_header("Cache-Control", cache_control)
+      self.end_headers()
+      return
+    if coding:
+      body = compress_json_body(body, coding, etag)
+      etag = variant_etag(etag, coding)
     self.send_response(status_code)
     self.send_header("Content-Type", "application/json; charset=utf-8")
     self.send_header("Content-Length", str(len(body)))
+    if coding:
+      self.send_header("Content-Encoding", coding)
+    if vary:
+      self.send_header("Vary", "Accept-Encoding")
+    if etag:
+      self.send_header("ETag", etag)
+    if cache_control:
+      self.send_header("Cache-Control", cache_control)
+    for key, value in (headers or {}).items():
+      self.send_header(key, value)
     self.end_headers()
     self.wfile.write(body)
 
-  def _send_text_file(self, file_path, content_type):
-    if not file_path.exists() or not file_path.is_file():
+  def _send_busy(self, retry_after):
+    self._send_json(503, {"error": "Server busy, retry later"}, {"Retry-After": str(int(retry_after))})
+
+  def _not_modified_since(self, mtime):
+    header = self.headers.get("If-Modified-Since")
+    if not header or self.headers.get("If-None-Match"):
+      return False
+    try:
+      since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+      return False
+    if since.tzinfo is None:
+      since = since.replace(tzinfo=UTC)
+    return mtime <= since.timestamp()
+
+  def _send_text_file(self, file_path, content_type, headers=None):
+    asset = STATIC_CACHE.get(file_path, content_type)
+    if asset is None:
       self.send_error(404, "Not Found")
       return
-    body = file_path.read_bytes()
+    use_gzip = asset.gzip_body is not None and accepts_encoding(self.headers.get("Accept-Encoding"), "gzip")
+    etag = variant_etag(asset.etag, "gzip") if use_gzip else asset.etag
+    extra = {"Cache-Control": "no-cache", **(headers or {})}
+    if asset.gzip_body is not None:
+      extra["Vary"] = "Accept-Encoding"
+    if self._etag_matches(asset.etag) or self._etag_matches(variant_etag(asset.etag, "gzip")) or self._not_modified_since(asset.mtime):
+      self.send_response(304)
+      self.send_header("ETag", etag)
+      self.send_header("Last-Modified", asset.last_modified)
+      for key, value in extra.items():
+        self.send_header(key, value)
+      self.end_headers()
+      return
+    body = asset.gzip_body if use_gzip else asset.body
     self.send_response(200)
     self.send_header("Content-Type", content_type)
-    self.send_header("Content-Length", str(len(body)))
+    self.send_header("Content-Length", str(asset.size if body is None else len(body)))
+    if use_gzip:
+      self.send_header("Content-Encoding", "gzip")
+    self.send_header("ETag", etag)
+    self.send_header("Last-Modified", asset.last_modified)
+    for key, value in extra.items():
+      self.send_header(key, value)
     self.end_headers()
-    self.wfile.write(body)
+    if body is not None:
+      self.wfile.write(body)
+      return
+    self._stream_file(asset.path, asset.size)
+
+  def _stream_file(self, file_path, size):
+    remaining = size
+    try:
+      with open(file_path, "rb") as fh:
+        while remaining > 0:
+          chunk = fh.read(min(UPLOAD_CHUNK_BYTES, remaining))
+          if not chunk:
+            break
+          self.wfile.write(chunk)
+          remaining -= len(chunk)
+    except FileNotFoundError:
+      pass
+    if remaining:
+      # The file changed after the headers went out; the response cannot be completed.
+      self.close_connection = True
 
   def _send_no_content(self):
     self.send_response(204)
     self.send_header("Content-Length", "0")
     self.end_headers()
 
+  def _handle_icon_upload_stream(self, mime_type, query):
+    # Raw image body: the size is checked from Content-Length before anything is read.
+    raw_length = self.headers.get("Content-Length")
+    if raw_length is None:
+      self._send_json(411, {"error": "缺少 Content-Length"})
+      return
+    try:
+      length = int(raw_length)
+    except ValueError:
+      self._send_json(400, {"error": "无效的 Content-Length"})
+      return
+    if length <= 0:
+      self._send_json(400, {"error": "图片为空"})
+      return
+    if length > MAX_ICON_UPLOAD_BYTES:
+      self.close_connection = True
+      self._send_json(413, {"error": "图片超过 1MB 限制"})
+      return
+    file_name = (query.get("name") or [""])[0] or self.headers.get("X-File-Name", "")
+    try:
+      icon_path = store_uploaded_icon_stream(file_name.strip(), mime_type, self.rfile, length)
+      self._body_bytes_read = length
+    except ValueError as err:
+      self.close_connection = True
+      self._send_json(400, {"error": str(err)})
+      return
+    self._send_json(201, {"iconUrl": icon_path})
+
   def _read_json_body(self):
     length = int(self.headers.get("Content-Length", 0))
     raw = self.rfile.read(length) if length > 0 else b"{}"
+    self._body_bytes_read = len(raw) if length > 0 else 0
     try:
       return json.loads(raw.decode("utf-8"))
     except json.JSONDecodeError:
@@ -931,6 +3371,11 @@ class Handler(BaseHTTPRequestHandler):
     token = auth[len("Bearer "):].strip()
     if not token:
       return None
+    if CACHE_BUS is not None:
+      CACHE_BUS.poll()
+    cached = SESSION_CACHE.get(token)
+    if cached is not None:
+      return cached
     with db_conn() as conn:
       row = conn.execute(
         """
@@ -943,19 +3388,22 @@ class Handler(BaseHTTPRequestHandler):
       ).fetchone()
       if not row:
         return None
-      if parse_iso(row["expires_at"]) <= now_dt():
+      expires_at = parse_iso(row["expires_at"])
+      if expires_at <= now_dt():
         conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
         return None
       if bool(row["is_disabled"]):
         conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
         return None
-      return {
+      user = {
         "id": row["id"],
         "username": row["username"],
         "isSuperAdmin": bool(row["is_super_admin"]),
         "isDisabled": bool(row["is_disabled"]),
         "token": token,
       }
+    SESSION_CACHE.put(token, user, expires_at.timestamp())
+    return user
 
   def _require_auth(self):
     user = self._auth_user()
@@ -987,7 +3435,11 @@ class Handler(BaseHTTPRequestHandler):
       return
 
     user_id = secrets.token_hex(8)
-    salt_hex, pass_hex = create_password_hash(password)
+    try:
+      salt_hex, pass_hex = create_password_hash(password)
+    except HashingBusyError as err:
+      self._send_busy(err.retry_after)
+      return
     created = now_iso()
     token = secrets.token_urlsafe(32)
     expires = (now_dt() + timedelta(days=SESSION_EXPIRE_DAYS)).replace(microsecond=0).isoformat().replace("+00:00", "Z")
@@ -1022,12 +3474,19 @@ class Handler(BaseHTTPRequestHandler):
       if bool(user["is_disabled"]):
         self._send_json(403, {"error": "Account disabled"})
         return
-      if not verify_password(password, user["password_salt"], user["password_hash"]):
-        self._send_json(401, {"error": "Invalid credentials"})
-        return
-      token = secrets.token_urlsafe(32)
-      created = now_iso()
-      expires = (now_dt() + timedelta(days=SESSION_EXPIRE_DAYS)).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+    # Verify outside the connection block so a pooled connection is not held for the hash.
+    try:
+      valid = verify_password(password, user["password_salt"], user["password_hash"])
+    except HashingBusyError as err:
+      self._send_busy(err.retry_after)
+      return
+    if not valid:
+      self._send_json(401, {"error": "Invalid credentials"})
+      return
+    token = secrets.token_urlsafe(32)
+    created = now_iso()
+    expires = (now_dt() + timedelta(days=SESSION_EXPIRE_DAYS)).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+    with db_conn() as conn:
       conn.execute(
         "INSERT INTO sessions (token, user_id, created_at, expires_at) VALUES (?, ?, ?, ?)",
         (token, user["id"], created, expires),
@@ -1055,15 +3514,21 @@ class Handler(BaseHTTPRequestHandler):
       if not row:
         self._send_json(404, {"error": "User not found"})
         return
+    try:
       if not verify_password(old_password, row["password_salt"], row["password_hash"]):
         self._send_json(401, {"error": "Current password is incorrect"})
         return
-
       salt_hex, pass_hex = create_password_hash(new_password)
+    except HashingBusyError as err:
+      self._send_busy(err.retry_after)
+      return
+
+    with db_conn() as conn:
       conn.execute(
         "UPDATE users SET password_salt = ?, password_hash = ? WHERE id = ?",
         (salt_hex, pass_hex, user["id"]),
       )
+    invalidate_user_sessions(user["id"])
     self._send_json(200, {"ok": True})
 
   def do_GET(self):
@@ -1123,6 +3588,29 @@ class Handler(BaseHTTPRequestHandler):
       )
       return
 
+    if path == "/api/admin/metrics":
+      user = self._require_super_admin()
+      if not user:
+        return
+      self._send_json(200, collect_metrics(self.server))
+      return
+
+    if path.startswith("/api/icons/jobs/"):
+      user = self._require_auth()
+      if not user:
+        return
+      job_id = path[len("/api/icons/jobs/"):]
+      try:
+        wait_seconds = float(query.get("wait", ["0"])[0] or 0)
+      except ValueError:
+        wait_seconds = 0.0
+      job = ICON_JOBS.get(job_id, max(0.0, min(wait_seconds, ICON_JOB_MAX_WAIT_SECONDS)))
+      if job is None:
+        self._send_json(404, {"error": "Job not found"})
+        return
+      self._send_json(200, icon_job_json(job))
+      return
+
     if path == "/api/subscriptions":
       user = self._require_auth()
       if not user:
@@ -1142,10 +3630,13 @@ class Handler(BaseHTTPRequestHandler):
       return
 
     if path == "/api/rates":
-      requested_base = (query.get("base", ["USD"])[0] or "USD").upper()
-      rates_payload = get_usd_rates()
-      rates_payload["requestedBase"] = requested_base
-      self._send_json(200, rates_payload)
+      requested_base = (query.get("base", ["USD"])[0] or "USD").strip().upper()
+      matrix = get_rate_matrix(requested_base)
+      if matrix is None:
+        self._send_json(400, {"error": "Unsupported base currency"})
+        return
+      body, etag = matrix
+      self._send_json_bytes(200, body, etag=etag, cache_control="private, no-cache")
       return
 
     if path == "/api/currencies":
@@ -1162,6 +3653,20 @@ class Handler(BaseHTTPRequestHandler):
       self._send_json(200, {"codes": codes, "items": items})
       return
 
+    if path == "/api/rates/history":
+      code = (query.get("code", [""])[0] or "").strip().upper()
+      if not code or not code.isalnum() or len(code) < 3 or len(code) > 10:
+        self._send_json(400, {"error": "Invalid code"})
+        return
+      try:
+        days = int(query.get("days", ["30"])[0] or 30)
+      except ValueError:
+        self._send_json(400, {"error": "Invalid days"})
+        return
+      days = max(1, min(days, 3660))
+      self._send_json(200, {"code": code, "base": "USD", "history": get_rate_history(code, days)})
+      return
+
     if path == "/api/currency-rate":
       code = (query.get("code", [""])[0] or "").strip().upper()
       if not code:
@@ -1175,7 +3680,7 @@ class Handler(BaseHTTPRequestHandler):
       except (URLError, TimeoutError, ValueError, json.JSONDecodeError):
         rates = {}
       if code in rates:
-        self._send_json(200, {"code": code, "usdRate": float(rates[code]), "source": "open-er-api"})
+        self._send_json(200, {"code": code, "usdRate": float(rates[code]), "source": OPEN_ER_CACHE["source"] or "open-er-api"})
         return
       fallback = FALLBACK_USD_RATES.get(code)
       if fallback is not None:
@@ -1243,16 +3748,23 @@ class Handler(BaseHTTPRequestHandler):
 
     if path.startswith("/assets/"):
       rel = path.lstrip("/")
-      file_path = BASE_DIR / rel
+      file_path = (BASE_DIR / rel).resolve()
       try:
-        file_path.relative_to(BASE_DIR)
+        file_path.relative_to(BASE_DIR / "assets")
       except ValueError:
         self.send_error(403, "Forbidden")
         return
       ctype = mimetypes.guess_type(str(file_path))[0] or "application/octet-stream"
       if ctype.startswith("text/") or ctype in {"image/svg+xml", "application/javascript"}:
         ctype = f"{ctype}; charset=utf-8" if "charset" not in ctype else ctype
-      self._send_text_file(file_path, ctype)
+      headers = None
+      if path.startswith(MIRROR_URL_PREFIX) or path.startswith("/assets/uploads/"):
+        # Mirrored and uploaded files are write-once (named by content hash), so they never change in place.
+        headers = {
+          "Cache-Control": "public, max-age=31536000, immutable",
+          "Content-Security-Policy": "default-src 'none'; style-src 'unsafe-inline'",
+        }
+      self._send_text_file(file_path, ctype, headers)
       return
 
     self.send_error(404, "Not Found")
@@ -1273,13 +3785,60 @@ class Handler(BaseHTTPRequestHandler):
       if not name:
         self._send_json(400, {"error": "Missing name"})
         return
-      self._send_json(200, resolve_icon_url(name, category))
+      cached = resolve_icon_cached(name, category)
+      if cached is not None:
+        self._send_json(200, cached)
+        return
+      try:
+        job = ICON_JOBS.submit(name, category)
+      except IconQueueFullError:
+        self._send_busy(2)
+        return
+      self._send_json(202, icon_job_json(job))
+      return
+
+    if parsed.path == "/api/icons/resolve-batch":
+      user = self._require_auth()
+      if not user:
+        return
+      payload = self._read_json_body()
+      if payload is None:
+        self._send_json(400, {"error": "Invalid JSON"})
+        return
+      raw_items = payload.get("items")
+      if not isinstance(raw_items, list) or not raw_items:
+        self._send_json(400, {"error": "Missing items"})
+        return
+      if len(raw_items) > ICON_BATCH_MAX_ITEMS:
+        self._send_json(400, {"error": f"Too many items (max {ICON_BATCH_MAX_ITEMS})"})
+        return
+      items = []
+      for item in raw_items:
+        if not isinstance(item, dict):
+          self._send_json(400, {"error": "Invalid item"})
+          return
+        name = str(item.get("name") or "").strip()
+        if not name:
+          self._send_json(400, {"error": "Missing name"})
+          return
+        items.append((name, str(item.get("category") or "").strip()))
+      try:
+        results = resolve_icons_batch(items)
+      except IconQueueFullError:
+        self._send_busy(2)
+        return
+      self._send_json(200, {"items": results})
       return
 
     if parsed.path == "/api/icons/upload":
       user = self._require_auth()
       if not user:
         return
+      ctype = (self.headers.get("Content-Type") or "").split(";", 1)[0].strip().lower()
+      if ctype.startswith("image/") or ctype == "application/octet-stream":
+        mime_type = "" if ctype == "application/octet-stream" else ctype
+        self._handle_icon_upload_stream(mime_type, parse_qs(parsed.query))
+        return
       payload = self._read_json_body()
       if payload is None:
         self._send_json(400, {"error": "Invalid JSON"})
@@ -1317,6 +3876,7 @@ class Handler(BaseHTTPRequestHandler):
         return
       with db_conn() as conn:
         conn.execute("DELETE FROM sessions WHERE token = ?", (user["token"],))
+      invalidate_session(user["token"])
       self._send_json(200, {"ok": True})
       return
 
@@ -1388,6 +3948,7 @@ class Handler(BaseHTTPRequestHandler):
         )
         if disabled:
           conn.execute("DELETE FROM sessions WHERE user_id = ?", (target_user_id,))
+      invalidate_user_sessions(target_user_id)
       self._send_json(200, {"ok": True})
       return
 
@@ -1536,13 +4097,240 @@ class Handler(BaseHTTPRequestHandler):
     self._send_json(200, {"ok": True})
 
 
+class BoundedPoolHTTPServer(HTTPServer):
+  # Fixed worker threads fed by a bounded queue of accepted connections. When the
+  # queue is full the connection gets an immediate 503 with Retry-After instead of
+  # another thread.
+  request_queue_size = 128
+
+  def __init__(self, server_address, handler_class, workers, queue_limit, retry_after, keepalive_timeout):
+    super().__init__(server_address, handler_class)
+    self.workers = max(1, workers)
+    self.queue_limit = max(1, queue_limit)
+    self.retry_after = max(1, retry_after)
+    self.keepalive_timeout = keepalive_timeout
+    self._queue = queue.Queue(self.queue_limit)
+    self._lock = threading.Lock()
+    self.active = 0
+    self.accepted = 0
+    self.rejected = 0
+    self.peak_queue_depth = 0
+    body = json.dumps({"error": "Server busy, retry later"}).encode("utf-8")
+    self._busy_response = (
+      "HTTP/1.1 503 Service Unavailable\r\n"
+      "Content-Type: application/json; charset=utf-8\r\n"
+      f"Retry-After: {self.retry_after}\r\n"
+      f"Content-Length: {len(body)}\r\n"
+      "Connection: close\r\n\r\n"
+    ).encode("ascii") + body
+    for index in range(self.workers):
+      threading.Thread(target=self._work, name=f"http-worker-{index}", daemon=True).start()
+
+  def process_request(self, request, client_address):
+    try:
+      self._queue.put_nowait((request, client_address))
+    except queue.Full:
+      with self._lock:
+        self.rejected += 1
+      self._reject(request)
+      return
+    depth = self._queue.qsize()
+    with self._lock:
+      self.accepted += 1
+      self.peak_queue_depth = max(self.peak_queue_depth, depth)
+
+  def _reject(self, request):
+    # Runs on the accept thread, so it must never block: consume whatever part of
+    # the request already arrived (closing over unread data would reset the
+    # connection before the client sees the 503), answer and close.
+    try:
+      request.setblocking(False)
+      try:
+        request.recv(64 * 1024)
+      except BlockingIOError:
+        pass
+      request.send(self._busy_response)
+    except OSError:
+      pass
+    self.shutdown_request(request)
+
+  def _work(self):
+    while True:
+      request, client_address = self._queue.get()
+      with self._lock:
+        self.active += 1
+      try:
+        self.finish_request(request, client_address)
+      except Exception:
+        self.handle_error(request, client_address)
+      finally:
+        self.shutdown_request(request)
+        with self._lock:
+          self.active -= 1
+
+  def has_backlog(self):
+    return not self._queue.empty()
+
+  def stats(self):
+    with self._lock:
+      return {
+        "mode": "pool",
+        "workers": self.workers,
+        "active": self.active,
+        "queueDepth": self._queue.qsize(),
+        "queueLimit": self.queue_limit,
+        "peakQueueDepth": self.peak_queue_depth,
+        "accepted": self.accepted,
+        "rejected": self.rejected,
+      }
+
+
+class ReusePortMixin:
+  # Prefork workers each bind their own listening socket to the same port; the
+  # kernel spreads incoming connections across them.
+  def server_bind(self):
+    self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    super().server_bind()
+
+
+class ReusePortThreadingHTTPServer(ReusePortMixin, ThreadingHTTPServer):
+  pass
+
+
+class ReusePortPoolHTTPServer(ReusePortMixin, BoundedPoolHTTPServer):
+  pass
+
+
+def build_http_server(host, port, reuse_port=False):
+  if SERVER_MODE == "pool":
+    server_class = ReusePortPoolHTTPServer if reuse_port else BoundedPoolHTTPServer
+    return server_class(
+      (host, port),
+      Handler,
+      SERVER_WORKERS,
+      SERVER_QUEUE_LIMIT,
+      SERVER_RETRY_AFTER_SECONDS,
+      SERVER_POOL_KEEPALIVE_SECONDS,
+    )
+  if SERVER_MODE != "threading":
+    raise RuntimeError(f"unknown SERVER_MODE: '{SERVER_MODE}'")
+  server_class = ReusePortThreadingHTTPServer if reuse_port else ThreadingHTTPServer
+  return server_class((host, port), Handler)
+
+
+def start_background_tasks(leader=True):
+  load_persisted_fx()
+  if not leader:
+    # Followers take FX from SQLite; sweeping and GC run once, in the leader.
+    FX_SYNCER.start(run_immediately=True)
+    return
+  purge_expired_sessions()
+  SESSION_SWEEPER.start()
+  FX_REFRESHER.start(run_immediately=True)
+  UPLOAD_GC.start()
+
+
+def run_worker(host, port, index):
+  global WORKER_INDEX
+  WORKER_INDEX = index
+  DB_POOL.reset_after_fork()
+  CACHE_BUS.attach()
+  start_background_tasks(leader=index == 0)
+  server = build_http_server(host, port, reuse_port=True)
+  server.serve_forever()
+
+
+def _fork(target, *args):
+  sys.stdout.flush()
+  sys.stderr.flush()
+  # Signals stay blocked across fork() so a child never runs the supervisor's
+  # handlers: it resets them first and only then accepts signals.
+  stop_signals = {signal.SIGTERM, signal.SIGINT}
+  old_mask = signal.pthread_sigmask(signal.SIG_BLOCK, stop_signals)
+  pid = os.fork()
+  if pid:
+    signal.pthread_sigmask(signal.SIG_SETMASK, old_mask)
+    return pid
+  signal.signal(signal.SIGTERM, signal.SIG_DFL)
+  # Ctrl-C reaches the whole process group; the supervisor handles it.
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  signal.pthread_sigmask(signal.SIG_SETMASK, old_mask)
+  code = 0
+  try:
+    target(*args)
+  except BaseException:
+    traceback.print_exc()
+    code = 1
+  finally:
+    os._exit(code)
+
+
+def run_prefork(host, port, processes):
+  global CACHE_BUS
+  # Schema setup runs in a throwaway child so the supervisor itself never opens
+  # SQLite connections or starts threads that fork() would copy into workers.
+  _, status = os.waitpid(_fork(init_db), 0)
+  if os.waitstatus_to_exitcode(status) != 0:
+    raise SystemExit("Database initialisation failed")
+  CACHE_BUS = CacheInvalidationBus()
+
+  children = {}
+  started_at = {}
+  stopping = False
+
+  def spawn(index):
+    pid = _fork(run_worker, host, port, index)
+    children[pid] = index
+    started_at[index] = time.monotonic()
+
+  def stop(signum, frame):
+    nonlocal stopping
+    stopping = True
+    for pid in list(children):
+      try:
+        os.kill(pid, signal.SIGTERM)
+      except ProcessLookupError:
+        pass
+
+  signal.signal(signal.SIGTERM, stop)
+  signal.signal(signal.SIGINT, stop)
+  for index in range(processes):
+    spawn(index)
+  print(f"Using DB path: {DB_PATH}")
+  print(f"Serving on http://{host}:{port} ({SERVER_MODE} mode, {processes} processes)")
+
+  while children:
+    try:
+      pid, status = os.wait()
+    except ChildProcessError:
+      break
+    except InterruptedError:
+      continue
+    index = children.pop(pid, None)
+    if index is None or stopping:
+      continue
+    print(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+    if time.monotonic() - started_at.get(index, 0.0) < 1.0:
+      # Crash loop (e.g. the port is taken): do not spin.
+      time.sleep(1.0)
+    spawn(index)
+
+
 def main():
-  init_db()
   host = os.environ.get("HOST", "127.0.0.1")
   port = int(os.environ.get("PORT", "5173"))
-  server = ThreadingHTTPServer((host, port), Handler)
+  if SERVER_MODE not in SERVER_MODES:
+    raise RuntimeError(f"unknown SERVER_MODE: '{SERVER_MODE}' (expected {' or '.join(SERVER_MODES)})")
+  if SERVER_PROCESSES > 1:
+    if hasattr(os, "fork") and hasattr(socket, "SO_REUSEPORT"):
+      run_prefork(host, port, SERVER_PROCESSES)
+      return
+    print("SERVER_PROCESSES > 1 needs fork() and SO_REUSEPORT; running a single process")
+  init_db()
+  start_background_tasks()
+  server = build_http_server(host, port)
   print(f"Using DB path: {DB_PATH}")
-  print(f"Serving on http://{host}:{port}")
+  print(f"Serving on http://{host}:{port} ({SERVER_MODE} mode)")
   server.serve_forever()
 
 